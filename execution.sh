@@ -1,10 +1,3 @@
 #!/bin/bash
 sudo apt update && sudo apt install mininet openvswitch-switch iperf iperf3 python3-psutil -y
-cd scenario-I
-sudo python3 script.py
-cd ../scenario-II
-sudo python3 script.py
-cd ../scenario-III
-sudo python3 script.py
-cd ../scenario-IV
-sudo python3 script.py
\ No newline at end of file
+sudo python3 -m testbed scenario-I scenario-II scenario-III scenario-IV
@@ -0,0 +1,112 @@
+"""Run several scenarios concurrently, each one pinned to its own CPU set.
+
+Every scenario gets a distinct node/interface prefix (s1, s2, ...) so the
+Mininet topologies do not collide, and is started under `taskset` with a
+set of physical cores that no other scenario uses.  When the machine does
+not have enough cores for the requested parallelism, the scenarios are run
+in waves instead of sharing cores, since shared cores would skew the
+throughput and CPU metrics.
+
+Options this runner does not know (--reuse-topology, --adaptive, ...) are
+passed on to every `python3 -m testbed` it starts. All the scenarios store
+their results in the same database (--results, results.sqlite by default).
+
+Usage: sudo python3 run_parallel.py [--scenarios scenario-I scenario-II ...] [testbed options]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SCENARIOS = ['scenario-I', 'scenario-II', 'scenario-III', 'scenario-IV']
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def physical_cores():
+    """Group the CPUs available to this process by physical core (SMT siblings together)."""
+    cores = {}
+    for cpu in sorted(os.sched_getaffinity(0)):
+        topology = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{topology}/physical_package_id") as f:
+                package = f.read().strip()
+            with open(f"{topology}/core_id") as f:
+                core = f.read().strip()
+        except OSError:
+            package, core = "0", str(cpu)
+        cores.setdefault((package, core), []).append(cpu)
+    return list(cores.values())
+
+def allocate_cpu_sets(num_scenarios, cores_per_scenario, reserved_cores):
+    """Split the available physical cores into disjoint CPU sets.
+
+    Returns the list of CPU sets (at most `num_scenarios`) and a list of
+    warnings describing why the requested parallelism could not be met.
+    """
+    cores = physical_cores()
+    warnings = []
+
+    usable = cores[reserved_cores:]
+    slots = len(usable) // cores_per_scenario
+    if slots == 0:
+        raise SystemExit(
+            f"Only {len(usable)} physical core(s) available after reserving {reserved_cores}, "
+            f"but each scenario needs {cores_per_scenario}.")
+    if slots < num_scenarios:
+        warnings.append(
+            f"{num_scenarios} scenarios x {cores_per_scenario} cores need "
+            f"{num_scenarios * cores_per_scenario} physical cores, only {len(usable)} are available: "
+            f"running at most {slots} scenario(s) at a time to avoid skewing the results.")
+
+    cpu_sets = []
+    for slot in range(min(slots, num_scenarios)):
+        group = usable[slot * cores_per_scenario:(slot + 1) * cores_per_scenario]
+        cpu_sets.append(sorted(cpu for core in group for cpu in core))
+
+    if any(len(core) > 1 for core in cores):
+        warnings.append("SMT is enabled: each scenario gets whole physical cores, "
+                        "including their hyperthread siblings.")
+    return cpu_sets, warnings
+
+def launch(scenario, prefix, cpu_set, extra_args):
+    """Start a scenario pinned to `cpu_set`; its output goes to parallel.log in the scenario directory."""
+    cpu_list = ",".join(str(cpu) for cpu in cpu_set)
+    command = ["taskset", "-c", cpu_list, sys.executable, "-m", "testbed", scenario, "--prefix", prefix] + extra_args
+    log = open(os.path.join(ROOT, scenario, "parallel.log"), "w")
+    print(f"Starting {scenario} (prefix {prefix}) on CPUs {cpu_list}")
+    return subprocess.Popen(command, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT), log
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the scenarios concurrently with CPU and namespace isolation.")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, help="scenario directories to run")
+    parser.add_argument("--cores-per-scenario", type=int, default=2,
+                        help="physical cores reserved for each scenario (iperf3 client, server and softirq work)")
+    parser.add_argument("--reserved-cores", type=int, default=1,
+                        help="physical cores left free for the system and this runner")
+    return parser.parse_known_args()
+
+if __name__ == '__main__':
+    args, extra_args = parse_args()
+    if os.geteuid() != 0:
+        raise SystemExit("Mininet needs root: run with sudo.")
+
+    cpu_sets, warnings = allocate_cpu_sets(len(args.scenarios), args.cores_per_scenario, args.reserved_cores)
+    for warning in warnings:
+        print(f"Warning: {warning}")
+
+    pending = list(enumerate(args.scenarios, start=1))
+    failed = []
+    while pending:
+        wave, pending = pending[:len(cpu_sets)], pending[len(cpu_sets):]
+        running = [(scenario, *launch(scenario, f"s{index}", cpu_set, extra_args))
+                   for (index, scenario), cpu_set in zip(wave, cpu_sets)]
+        for scenario, process, log in running:
+            returncode = process.wait()
+            log.close()
+            if returncode != 0:
+                failed.append(scenario)
+            print(f"{scenario} finished with exit code {returncode}")
+
+    if failed:
+        raise SystemExit(f"Failed scenarios: {', '.join(failed)}")
+    print("All scenarios completed.")
@@ -0,0 +1,6 @@
+"""Mininet testbed comparing TCP congestion control algorithms over IPv4 and IPv6.
+
+The network conditions of each scenario are declared in a scenario.json
+file (see testbed.scenario); `python3 -m testbed` expands them into a job
+matrix and runs it.
+"""
@@ -0,0 +1,130 @@
+"""Run the TCP congestion control tests of one or more scenarios.
+
+Usage: sudo python3 -m testbed [options] scenario-I [scenario-II ...]
+"""
+import argparse
+import os
+
+from mininet.log import setLogLevel
+
+from .runner import run_campaign
+from .scenario import deduplicate, expand_matrix, load_scenario, reorder, shard
+
+def parse_shard(value):
+    """Parse a K/N shard specification."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, expected K/N")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, K must be between 1 and N")
+    return index, count
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the TCP congestion control tests of the given scenarios.")
+    parser.add_argument("scenarios", nargs="+",
+                        help="scenario specification files, or directories holding a scenario.json")
+    parser.add_argument("--list", action="store_true",
+                        help="print the cells that would run and exit")
+    parser.add_argument("--order", choices=["spec", "shuffle"], default="spec",
+                        help="run the cells in specification order or in random order")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random seed of --order shuffle")
+    parser.add_argument("--shard", type=parse_shard, default=(1, 1), metavar="K/N",
+                        help="only run the K-th of N interleaved slices of the cells")
+    parser.add_argument("--results", default="results.sqlite",
+                        help="SQLite database the results of the campaign are stored in")
+    parser.add_argument("--timeseries", default="timeseries",
+                        help="directory the per-interval series of the runs are stored in ('' to disable)")
+    parser.add_argument("--csv", action="store_true",
+                        help="also append every run to the per-cell dataset_<ip>_<tcp>.csv files")
+    parser.add_argument("--calibration", default="calibration.json",
+                        help="JSON cache of the achievable bandwidth of each topology on this host, measured "
+                             "before the campaign and used as the reference of the bandwidth efficiency "
+                             "('' to use the scenarios' max_bandwidth_gbps)")
+    parser.add_argument("--calibration-streams", type=int, default=8,
+                        help="parallel streams of the calibration runs")
+    parser.add_argument("--calibration-duration", type=int, default=10,
+                        help="seconds of each calibration run")
+    parser.add_argument("--recalibrate", action="store_true",
+                        help="measure the achievable bandwidth again even if it is cached")
+    parser.add_argument("--reuse-topology", action="store_true",
+                        help="build each topology once and reuse it across all runs "
+                             "(the points of a sweep reconfigure its bottleneck in place)")
+    parser.add_argument("--prefix", default="",
+                        help="prefix for node and interface names (used when scenarios run in parallel)")
+    parser.add_argument("--pairs", type=int, default=1,
+                        help="number of isolated h1/h2 paths; with more than one, that many TCP versions "
+                             "are measured at the same time, one per path")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="repeat each (TCP version, IP version) cell until the confidence interval of "
+                             "throughput, mean RTT and retransmissions is narrow enough, instead of the "
+                             "scenario's number of repetitions")
+    parser.add_argument("--min-runs", type=int, default=5,
+                        help="minimum number of runs per cell in adaptive mode")
+    parser.add_argument("--max-runs", type=int, default=60,
+                        help="maximum number of runs per cell in adaptive mode")
+    parser.add_argument("--ci-target", type=float, default=0.05,
+                        help="target CI half-width relative to the mean in adaptive mode (0.05 = 5%%); the "
+                             "retransmissions also converge within +-1 of their mean")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="confidence level of the intervals in adaptive mode")
+    parser.add_argument("--json-stream", action="store_true",
+                        help="ingest the iperf3 interval reports as they arrive (iperf3 --json-stream, "
+                             "3.17 or later) instead of parsing one JSON document at exit")
+    parser.add_argument("--report-interval", type=float, default=0.5,
+                        help="seconds between the interval reports of streamed iperf3 clients")
+    parser.add_argument("--cpu-interval", type=float, default=0.1,
+                        help="seconds between the CPU usage samples taken during each test")
+    parser.add_argument("--ss-interval", type=float, default=None,
+                        help="poll the TCP state of the test sockets with `ss -tin` every this many seconds "
+                             "(e.g. 0.02); off by default")
+    parser.add_argument("--tcp-probe", action="store_true",
+                        help="capture the per-ACK cwnd of the test flows with the tcp:tcp_probe tracepoint "
+                             "(needs tracefs and its sock_cookie field; skipped with a warning when unavailable)")
+    parser.add_argument("--capture", type=int, default=None, metavar="MB",
+                        help="capture the packet headers of each test on the r1-r2 link with tcpdump into a ring "
+                             "of this many MB, then count the segments, losses, duplicate ACKs and SACK blocks "
+                             "that crossed it; off by default")
+    parser.add_argument("--latency-probe", type=float, default=None,
+                        help="ping h2 from h1 every this many seconds during each test (e.g. 0.01) to measure "
+                             "the queueing delay under load; off by default")
+    parser.add_argument("--steady-state", action="store_true",
+                        help="end each iperf3 test once throughput and cwnd are steady "
+                             "(the scenario's duration at most); implies --json-stream")
+    parser.add_argument("--steady-window", type=float, default=3,
+                        help="length (s) of the windows compared by the steady-state detector")
+    parser.add_argument("--steady-tolerance", type=float, default=0.05,
+                        help="maximum relative change between consecutive windows at steady state")
+    parser.add_argument("--run-timeout", type=float, default=30,
+                        help="seconds an iperf3 client may run past the test duration before it is killed")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="times a failed or hung run is retried before it counts as a failure")
+    parser.add_argument("--quarantine-after", type=int, default=3,
+                        help="failed runs in a row after which a cell is quarantined and skipped")
+    args = parser.parse_args()
+    if args.adaptive and not 4 <= args.min_runs <= args.max_runs:
+        parser.error("adaptive mode needs 4 <= --min-runs <= --max-runs")
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    try:
+        scenarios = [load_scenario(path) for path in args.scenarios]
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Invalid scenario: {e}")
+
+    cells = deduplicate(expand_matrix(scenarios))
+    cells = shard(reorder(cells, args.order, args.seed), *args.shard)
+
+    if args.list:
+        for cell in cells:
+            outputs = ", ".join(os.path.relpath(output_dir) for output_dir in cell.output_dirs)
+            print(f"{cell.tcp_version:10} {cell.ip_version:5} -P{cell.streams:<3} x{cell.repetitions:<3} {cell.duration:>4}s  "
+                  f"{cell.links['bottleneck']}  -> {outputs}")
+        raise SystemExit(0)
+
+    setLogLevel('info')
+    run_campaign(cells, args)
+    print("All tests completed.")
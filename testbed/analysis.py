@@ -0,0 +1,178 @@
+"""Incremental analysis of a results database: medians, bootstrap CIs and IPv4-vs-IPv6 deltas.
+
+The runs of every scenario in the `runs` table are aggregated per cell
+and flow, and the cells that differ by IP version alone (a "condition":
+the cell identity without its IP version) are compared. The aggregates
+are cached in the same database:
+
+    aggregates      scenario | condition | cell | flow | tcp_version | ip_version | metric | runs | median | ci_low | ci_high
+    ip_deltas       scenario | condition | flow | tcp_version | metric | ipv4_median | ipv6_median | delta | ci_low | ci_high
+    analysis_state  scenario | condition | flow | signature
+
+`delta` is the IPv6 median minus the IPv4 one; the confidence intervals
+are percentile bootstrap intervals of the median and of the delta. The
+signature of a condition changes when its cells receive new or replaced
+runs (or with other analysis parameters), and only those conditions are
+analysed again.
+
+Usage: python3 -m testbed.analysis [--results results.sqlite] [--resamples 2000] [--confidence 0.95]
+"""
+import argparse
+import json
+import re
+import sqlite3
+import zlib
+
+import numpy
+
+from .metrics import ADAPTIVE_METRICS
+from .results import column_name
+
+DEFAULT_METRICS = ADAPTIVE_METRICS + ['Packet Loss (%)', 'Bandwidth Efficiency (%)']
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS aggregates (scenario TEXT NOT NULL, condition TEXT NOT NULL, cell TEXT NOT NULL, "
+    "flow INTEGER NOT NULL, tcp_version TEXT, ip_version TEXT, metric TEXT NOT NULL, runs INTEGER, median REAL, "
+    "ci_low REAL, ci_high REAL, PRIMARY KEY (scenario, cell, flow, metric))",
+    "CREATE TABLE IF NOT EXISTS ip_deltas (scenario TEXT NOT NULL, condition TEXT NOT NULL, flow INTEGER NOT NULL, "
+    "tcp_version TEXT, metric TEXT NOT NULL, ipv4_median REAL, ipv6_median REAL, delta REAL, ci_low REAL, "
+    "ci_high REAL, PRIMARY KEY (scenario, condition, flow, metric))",
+    "CREATE TABLE IF NOT EXISTS analysis_state (scenario TEXT NOT NULL, condition TEXT NOT NULL, "
+    "flow INTEGER NOT NULL, signature TEXT, PRIMARY KEY (scenario, condition, flow))",
+]
+
+def condition_of(cell):
+    """Identity of a cell without its IP version: the cells of both IP versions of a condition are compared."""
+    return re.sub(r'/IPv[46](?=/|$)', '', cell, count=1)
+
+def bootstrap_medians(values, resamples, rng):
+    """Medians of `resamples` bootstrap resamples of the runs (rows) of `values`, for every metric (column).
+
+    NULL metrics (NaN) are left out of the medians of their resamples.
+    Returns an array of shape (resamples, metrics).
+    """
+    indices = rng.integers(0, len(values), size=(resamples, len(values)))
+    samples = values[indices]
+    # A resample holding only NULLs has no median: NaN, without numpy's warning
+    valid = ~numpy.isnan(samples).all(axis=1)
+    medians = numpy.full(valid.shape, numpy.nan)
+    medians[valid] = numpy.nanmedian(samples.transpose(0, 2, 1)[valid], axis=1)
+    return medians
+
+def percentile_ci(samples, confidence):
+    """Percentile interval of the bootstrap samples (rows) of every column; NaN where they are all NULL."""
+    alpha = (1 - confidence) / 2
+    low, high = numpy.full(samples.shape[1], numpy.nan), numpy.full(samples.shape[1], numpy.nan)
+    valid = ~numpy.isnan(samples).all(axis=0)
+    if valid.any():
+        low[valid], high[valid] = numpy.nanquantile(samples[:, valid], [alpha, 1 - alpha], axis=0)
+    return low, high
+
+def to_sql(value):
+    """A NumPy value as a SQL value, NULL for NaN."""
+    return None if numpy.isnan(value) else float(value)
+
+class Analysis:
+    """Analyses the conditions of the results database at `path` whose runs changed since the last analysis."""
+
+    def __init__(self, path, metrics=DEFAULT_METRICS, resamples=2000, confidence=0.95):
+        self.metrics = list(metrics)
+        self.columns = [column_name(metric) for metric in self.metrics]
+        self.resamples = resamples
+        self.confidence = confidence
+        self.connection = sqlite3.connect(path, timeout=60)
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def signatures(self):
+        """The signature of every (scenario, condition, flow) of the runs table, with its cells.
+
+        A replaced run gets a new rowid, so the number of runs and the
+        highest rowid of each cell tell whether it changed.
+        """
+        parameters = {'metrics': self.columns, 'resamples': self.resamples, 'confidence': self.confidence}
+        conditions = {}
+        for scenario, cell, flow, runs, last in self.connection.execute(
+                "SELECT scenario, cell, flow, COUNT(*), MAX(rowid) FROM runs GROUP BY scenario, cell, flow"):
+            conditions.setdefault((scenario, condition_of(cell), flow), {})[cell] = [runs, last]
+        return {key: (json.dumps(dict(parameters, cells=cells), sort_keys=True), sorted(cells))
+                for key, cells in conditions.items()}
+
+    def run(self):
+        """Analyse the changed conditions; returns how many were analysed and how many there are."""
+        state = {(scenario, condition, flow): signature for scenario, condition, flow, signature
+                 in self.connection.execute("SELECT scenario, condition, flow, signature FROM analysis_state")}
+        signatures = self.signatures()
+        changed = [key for key, (signature, cells) in signatures.items() if state.get(key) != signature]
+        with self.connection:
+            for key in set(state) - set(signatures):
+                # Runs removed from the database
+                self._delete(*key)
+            for key in changed:
+                self._analyse(key, signatures[key][1])
+                self.connection.execute("INSERT OR REPLACE INTO analysis_state VALUES (?, ?, ?, ?)",
+                                        (*key, signatures[key][0]))
+        return len(changed), len(signatures)
+
+    def _delete(self, scenario, condition, flow):
+        for table in ("aggregates", "ip_deltas", "analysis_state"):
+            self.connection.execute(f"DELETE FROM {table} WHERE scenario = ? AND condition = ? AND flow = ?",
+                                    (scenario, condition, flow))
+
+    def _analyse(self, key, cells):
+        scenario, condition, flow = key
+        self._delete(scenario, condition, flow)
+        # Same resamples whenever the runs are the same
+        rng = numpy.random.default_rng(zlib.crc32(json.dumps(key).encode()))
+        medians = {}
+        for cell in cells:
+            rows = self.connection.execute(
+                f"SELECT tcp_version, ip_version, {', '.join(self.columns)} FROM runs "
+                f"WHERE scenario = ? AND cell = ? AND flow = ?", (scenario, cell, flow)).fetchall()
+            tcp_version, ip_version = rows[0][:2]
+            values = numpy.array([row[2:] for row in rows], dtype=float)
+            median = numpy.full(len(self.columns), numpy.nan)
+            measured = ~numpy.isnan(values).all(axis=0)
+            median[measured] = numpy.nanmedian(values[:, measured], axis=0)
+            samples = bootstrap_medians(values, self.resamples, rng)
+            low, high = percentile_ci(samples, self.confidence)
+            self.connection.executemany(
+                "INSERT INTO aggregates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(scenario, condition, cell, flow, tcp_version, ip_version, metric, len(rows),
+                  to_sql(median[i]), to_sql(low[i]), to_sql(high[i])) for i, metric in enumerate(self.metrics)])
+            medians[ip_version] = (tcp_version, median, samples)
+        if 'IPv4' in medians and 'IPv6' in medians:
+            tcp_version, ipv4, ipv4_samples = medians['IPv4']
+            ipv6, ipv6_samples = medians['IPv6'][1:]
+            low, high = percentile_ci(ipv6_samples - ipv4_samples, self.confidence)
+            self.connection.executemany(
+                "INSERT INTO ip_deltas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(scenario, condition, flow, tcp_version, metric, to_sql(ipv4[i]), to_sql(ipv6[i]),
+                  to_sql(ipv6[i] - ipv4[i]), to_sql(low[i]), to_sql(high[i])) for i, metric in enumerate(self.metrics)])
+
+    def close(self):
+        self.connection.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Aggregate the runs of a results database, analysing only the "
+                                                 "cells that received new runs since the last analysis.")
+    parser.add_argument("--results", default="results.sqlite",
+                        help="SQLite database of the campaign; the aggregates are cached in it")
+    parser.add_argument("--metrics", nargs="+", default=DEFAULT_METRICS,
+                        help="metrics to aggregate, as in the CSV datasets (e.g. 'Throughput (Gbps)')")
+    parser.add_argument("--resamples", type=int, default=2000,
+                        help="bootstrap resamples of each cell")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="confidence level of the bootstrap intervals")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    analysis = Analysis(args.results, args.metrics, args.resamples, args.confidence)
+    try:
+        changed, total = analysis.run()
+    finally:
+        analysis.close()
+    print(f"Analysed {changed} of {total} conditions; aggregates in the aggregates and ip_deltas tables "
+          f"of {args.results}")
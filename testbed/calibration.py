@@ -0,0 +1,156 @@
+"""Calibration of the bandwidth a topology can actually carry on this machine.
+
+The nominal "max_bandwidth_gbps" of a scenario is rarely reached: a veth
+path through two namespace routers is usually CPU-bound well below it,
+and some scenarios do not even shape their links. Before a campaign, the
+ceiling of every topology it uses is measured once, with the links
+stripped of their delay, jitter and loss and several parallel streams,
+and cached in a JSON file keyed by the links, the IP version, the number
+of streams and a fingerprint of the host, so it is measured again only on
+another machine, kernel or CPU set. The bandwidth efficiency of the runs
+is computed against that ceiling.
+"""
+import json
+import os
+import platform
+
+from .cpu import CpuSampler
+from .iperf import iperf_client_command, run_iperf_client, start_iperf_server
+from .topology import cleanup, create_topology
+
+# Link parameters left out of the calibration topology
+IMPAIRMENTS = ('delay', 'jitter', 'loss')
+
+# A run whose busiest core was this busy on average was limited by the CPU
+# rather than by the network, unless it reached this fraction of the
+# bandwidth its bottleneck is shaped to
+CPU_BOUND_PERCENT = 90
+SHAPED_FRACTION = 0.9
+
+def host_fingerprint():
+    """Identity of the machine a ceiling is valid on: host, kernel, CPU model and the CPUs the tests may use."""
+    model = ""
+    try:
+        with open("/proc/cpuinfo") as f:
+            model = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), "")
+    except OSError:
+        pass
+    return {'host': platform.node(), 'kernel': platform.release(), 'cpu': model,
+            'cpus': sorted(os.sched_getaffinity(0))}
+
+def calibration_links(links):
+    """The links of a topology without the impairments that are not part of its ceiling."""
+    return {name: {parameter: value for parameter, value in params.items() if parameter not in IMPAIRMENTS}
+            for name, params in links.items()}
+
+def measure_ceiling(links, ip_version, streams, duration, args):
+    """Measure the throughput (bit/s) of `streams` parallel flows on a fresh topology with `links`.
+
+    The flows run on the CPUs of this process, as the tests do (run_parallel.py
+    pins each scenario to its own cores). Returns the calibration entry:
+    the throughput and the mean load of the busiest core, or None when
+    iperf3 failed.
+    """
+    net, paths = create_topology(calibration_links(links), args.prefix)
+    try:
+        h1, h2 = paths[0]
+        start_iperf_server(h2, ip_version)
+        cpu = CpuSampler(args.cpu_interval).start()
+        try:
+            result = run_iperf_client(h1, iperf_client_command(h1, h2, ip_version, duration, streams=streams),
+                                      timeout=duration + args.run_timeout)[0]
+        except TimeoutError as e:
+            print(f"Error: {e}")
+            return None
+        finally:
+            cpu.stop()
+    finally:
+        cleanup(net)
+    try:
+        throughput = json.loads(result)['end']['sum_received']['bits_per_second']
+    except (KeyError, ValueError):
+        return None
+    return {'bandwidth': throughput, 'busiest_core': cpu.summary()['CPU Busiest Core (%)']}
+
+class Calibration:
+    """The achievable bandwidth of the topologies of a campaign, cached in the JSON file at `path`.
+
+    calibrate() measures the ceilings the cache lacks (all of them with
+    `refresh`) with measure_ceiling(); ceiling() returns the ceiling of a
+    cell in bit/s, None if it could not be measured.
+    """
+
+    def __init__(self, path, args, streams=8, duration=10, refresh=False):
+        self.path = path
+        self.args = args
+        self.streams = streams
+        self.duration = duration
+        self.refresh = refresh
+        self.fingerprint = host_fingerprint()
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            print(f"Warning: ignoring unreadable calibration cache {self.path}")
+            return {}
+
+    def _save(self):
+        # Scenarios running in parallel share the file: keep the entries they added
+        entries = dict(self._load(), **self.entries)
+        temporary = f"{self.path}.tmp{os.getpid()}"
+        with open(temporary, 'w') as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
+        self.entries = entries
+
+    def key(self, cell):
+        return json.dumps({'links': calibration_links(cell.links), 'ip_version': cell.ip_version,
+                           'streams': self.streams, 'host': self.fingerprint}, sort_keys=True)
+
+    def calibrate(self, cells):
+        """Measure the ceilings of the cells' topologies that are not cached yet."""
+        measured = set()
+        for cell in cells:
+            key = self.key(cell)
+            if key in measured or (key in self.entries and not self.refresh):
+                continue
+            measured.add(key)
+            print(f"Calibrating the achievable bandwidth of {cell.links['bottleneck']} with {cell.ip_version}...")
+            entry = measure_ceiling(cell.links, cell.ip_version, self.streams, self.duration, self.args)
+            if entry is None:
+                print("Warning: calibration failed, efficiency falls back to the nominal maximum bandwidth")
+                continue
+            entry['cpu_bound'] = is_cpu_bound(entry['busiest_core'], entry['bandwidth'], cell.links)
+            print(f"Achievable bandwidth: {entry['bandwidth'] / 1e9:.2f} Gbps "
+                  f"({'CPU' if entry['cpu_bound'] else 'network'}-bound, nominal {cell.max_bandwidth / 1e9:g} Gbps)")
+            self.entries[key] = entry
+            self._save()
+
+    def ceiling(self, cell):
+        entry = self.entries.get(self.key(cell))
+        return entry['bandwidth'] if entry else None
+
+def is_cpu_bound(busiest_core, throughput, links):
+    """Whether a flow of `throughput` bit/s was limited by the CPU: its busiest core saturated below the shaped rate."""
+    if busiest_core == '':
+        return None
+    shaped = links['bottleneck'].get('bw')
+    if shaped and throughput >= SHAPED_FRACTION * shaped * 1e6:
+        return False
+    return busiest_core >= CPU_BOUND_PERCENT
+
+def ceiling_metrics(row, links, ceiling, throughput=None):
+    """The achievable bandwidth of the path of a metrics row and whether its run was CPU-bound.
+
+    `throughput` (Gbps) is the total throughput on the bottleneck, when
+    the flow of the row shared it.
+    """
+    throughput = row['Throughput (Gbps)'] if throughput is None else throughput
+    cpu_bound = is_cpu_bound(row['CPU Busiest Core (%)'], throughput * 1e9, links)
+    return {'Achievable Bandwidth (Gbps)': round(ceiling / 1e9, 2) if ceiling else '',
+            'CPU Bound': '' if cpu_bound is None else int(cpu_bound)}
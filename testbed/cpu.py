@@ -0,0 +1,104 @@
+"""Background sampling of CPU usage during the tests."""
+import os
+import threading
+from time import monotonic
+
+import psutil
+
+from .stats import RunningStats
+from .timeseries import SampleSeries
+
+class CpuSampler:
+    """Samples per-core and per-process CPU usage in a background thread while a test runs.
+
+    Every `interval` seconds it records, for each core this process may run
+    on, the busy and softirq percentages, and the CPU percentage of the
+    watched processes (the iperf3 client and server, added with watch())
+    and of the ksoftirqd threads of those cores. The samples are kept as a
+    SampleSeries of kind "cpu" and summarised by summary().
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.cpus = sorted(os.sched_getaffinity(0))
+        self.series = SampleSeries('cpu')
+        self.stats = {}
+        self.processes = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="cpu-sampler", daemon=True)
+        self.start_time = None
+
+    def watch(self, label, pid):
+        """Also sample the process `pid` under `label` (e.g. "iperf3 client")."""
+        try:
+            process = psutil.Process(pid)
+            process.cpu_percent(None)  # The first call only sets the reference point
+        except psutil.Error:
+            return
+        with self.lock:
+            self.processes[label] = process
+
+    def start(self):
+        for process in psutil.process_iter(['name']):
+            name = process.info['name'] or ""
+            if name.startswith("ksoftirqd/") and name.split("/")[1].isdigit() and int(name.split("/")[1]) in self.cpus:
+                self.watch(name, process.pid)
+        psutil.cpu_times_percent(None, percpu=True)
+        self.start_time = monotonic()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling, taking a last sample so that short tests have at least one."""
+        self.stopped.set()
+        self.thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self._sample()
+
+    def _record(self, time, source, value):
+        self.series.add(time, source, value)
+        self.stats.setdefault(source, RunningStats()).add(value)
+
+    def _sample(self):
+        time = monotonic() - self.start_time
+        with self.lock:
+            per_cpu = psutil.cpu_times_percent(None, percpu=True)
+            busy, softirq = [], []
+            for cpu in self.cpus:
+                if cpu >= len(per_cpu):
+                    continue
+                times = per_cpu[cpu]
+                busy.append(100 - times.idle - getattr(times, 'iowait', 0))
+                softirq.append(getattr(times, 'softirq', 0))
+                self._record(time, f"cpu{cpu}", busy[-1])
+                self._record(time, f"cpu{cpu} softirq", softirq[-1])
+            if busy:
+                self._record(time, "local", sum(busy) / len(busy))
+                self._record(time, "busiest core", max(busy))
+                self._record(time, "local softirq", sum(softirq) / len(softirq))
+            for label, process in list(self.processes.items()):
+                try:
+                    self._record(time, label, process.cpu_percent(None))
+                except psutil.Error:
+                    # The process exited: it is no longer sampled
+                    del self.processes[label]
+
+    def mean(self, source):
+        stats = self.stats.get(source)
+        return round(stats.mean, 2) if stats and stats.count else ''
+
+    def summary(self, client="iperf3 client", server="iperf3 server"):
+        """Summary metrics of the test, with the given labels for its client and server processes."""
+        ksoftirqd = [stats.mean for source, stats in self.stats.items() if source.startswith("ksoftirqd/")]
+        return {
+            'CPU Usage Local (%)': self.mean("local"),
+            'CPU Busiest Core (%)': self.mean("busiest core"),
+            'CPU Softirq (%)': self.mean("local softirq"),
+            'CPU iperf3 Client (%)': self.mean(client),
+            'CPU iperf3 Server (%)': self.mean(server),
+            'CPU ksoftirqd (%)': round(sum(ksoftirqd), 2) if ksoftirqd else '',
+        }
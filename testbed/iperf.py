@@ -0,0 +1,405 @@
+"""iperf3 servers and clients, and parsing of their JSON output."""
+from collections import deque
+from time import sleep, time
+import json
+import os
+import signal
+import subprocess
+import threading
+
+from .metrics import stream_fairness
+from .recovery import RecoveryTracker, recovery_metrics
+from .stats import PERCENTILES, RunningStats, merged
+
+def configure_tcp_version(host, tcp_version):
+    """Configure TCP version for the given host."""
+    host.cmd(f"sysctl -w net.ipv4.tcp_congestion_control={tcp_version}")
+
+def load_tcp_module(tcp_version):
+    """Load the kernel module of a congestion control algorithm (no-op for built-in ones)."""
+    os.system(f"modprobe -q tcp_{tcp_version}")
+
+def iperf_port(ip_version):
+    """Port of the iperf3 server for an IP version."""
+    return 5202 if ip_version == "IPv6" else 5201
+
+def is_listening(host, port):
+    """Check whether a TCP socket is listening on `port` in the host's namespace."""
+    return bool(host.cmd(f"ss -Hltn sport = :{port}").strip())
+
+def wait_for_server(h2, port, timeout=5, poll_interval=0.01):
+    """Wait until a TCP socket is listening on `port` in h2's namespace.
+
+    Returns the time spent waiting in seconds, or None if the server was
+    not listening after `timeout` seconds.
+    """
+    start = time()
+    while time() - start < timeout:
+        if is_listening(h2, port):
+            return round(time() - start, 3)
+        sleep(poll_interval)
+    print(f"Warning: iperf3 server on {h2} port {port} not ready after {timeout}s")
+    return None
+
+class IperfServer:
+    """A long-lived iperf3 server of a host for one IP version.
+
+    The server is started once and reused by every test against the host;
+    it is health-checked before each test and restarted if it died or
+    stopped listening.
+    """
+
+    def __init__(self, host, ip_version):
+        self.host = host
+        self.ip_version = ip_version
+        self.port = iperf_port(ip_version)
+        self.process = None
+
+    def is_healthy(self):
+        """The server process is alive and listening on its port."""
+        return self.process is not None and self.process.poll() is None and is_listening(self.host, self.port)
+
+    def start(self):
+        """Start the server and return the time spent waiting for it to listen (None on timeout)."""
+        if is_listening(self.host, self.port):
+            # An unmanaged server holds the port: remove it instead of racing with it
+            self.host.cmd(f"pkill --ns {self.host.pid} --nslist net -f 'iperf3 -s.* -p {self.port}'")
+        family = ["-6"] if self.ip_version == "IPv6" else []
+        self.process = self.host.popen(["iperf3", "-s", *family, "-p", str(self.port)],
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return wait_for_server(self.host, self.port)
+
+    def ensure_running(self):
+        """Start or restart the server if needed and return the time spent waiting for it."""
+        if self.is_healthy():
+            return 0.0
+        if self.process is not None:
+            print(f"iperf3 server on {self.host} port {self.port} is not healthy, restarting it")
+            self.stop()
+        return self.start()
+
+    def stop(self):
+        """Stop the server, killing it if it does not exit on SIGTERM."""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+def start_iperf_server(h2, ip_version):
+    """Make sure the persistent iperf3 server of h2 for `ip_version` is running.
+
+    Returns the time spent waiting for the server to listen: 0 when the
+    server was already up, None if it could not be started.
+    """
+    if not hasattr(h2, "iperf_servers"):
+        h2.iperf_servers = {}
+    if ip_version not in h2.iperf_servers:
+        h2.iperf_servers[ip_version] = IperfServer(h2, ip_version)
+    return h2.iperf_servers[ip_version].ensure_running()
+
+def stop_iperf_servers(host):
+    """Shut down the persistent iperf3 servers of a host."""
+    for server in getattr(host, "iperf_servers", {}).values():
+        server.stop()
+
+def iperf_client_command(h1, h2, ip_version, duration, tcp_version=None, stream_interval=None, streams=1):
+    """Build the iperf3 client command for a `duration`-second test from h1 to h2 with `streams` parallel streams.
+
+    When `tcp_version` is given, the congestion control algorithm is
+    selected for the test socket only (iperf3 --congestion) instead of
+    relying on the namespace-wide sysctl. With `stream_interval`, iperf3
+    reports every `stream_interval` seconds as line-delimited JSON events
+    (--json-stream, iperf3 3.17 or later) instead of one document at exit.
+    """
+    if ip_version == "IPv6":
+        # Use the fixed IPv6 address of h2 for iperf test
+        command = f"iperf3 -c {h2.ip6}%{h1}-eth0 -6 -p {iperf_port(ip_version)} -t {duration} -J"  # IPv6 test
+    else:
+        command = f"iperf3 -c {h2.IP()} -p {iperf_port(ip_version)} -t {duration} -J"  # IPv4 test
+    if streams > 1:
+        command += f" -P {streams}"
+    if tcp_version:
+        command += f" --congestion {tcp_version}"
+    if stream_interval:
+        command += f" -i {stream_interval} --json-stream"
+    return command
+
+class SteadyStateDetector:
+    """Detects when a flow has reached steady state from its interval reports.
+
+    The flow is steady once the mean throughput and the mean cwnd of the
+    last `window` intervals are both within `tolerance` (relative) of the
+    means of the `window` intervals before them.
+    """
+
+    def __init__(self, window, tolerance):
+        self.window = window
+        self.tolerance = tolerance
+        self.samples = deque(maxlen=2 * window)
+
+    def update(self, throughput, cwnd):
+        """Add the throughput and cwnd of an interval; returns True once the flow is steady."""
+        self.samples.append((throughput, cwnd))
+        if len(self.samples) < 2 * self.window:
+            return False
+        samples = list(self.samples)
+        for column in (0, 1):
+            previous = sum(sample[column] for sample in samples[:self.window]) / self.window
+            recent = sum(sample[column] for sample in samples[self.window:]) / self.window
+            if previous == 0 or abs(recent - previous) / previous > self.tolerance:
+                return False
+        return True
+
+class IperfStream:
+    """Incremental ingestion of the events of an iperf3 --json-stream client.
+
+    The interval reports update running statistics as they arrive and are
+    then dropped, so memory stays constant whatever the test length and
+    interval granularity. Only the 'start' and 'end' events, whose size
+    does not depend on the test length, are kept.
+
+    Throughput, RTT and cwnd are summarised per stream (by socket) and for
+    the whole test: the throughput and cwnd of the test are the sums over
+    its streams, its RTT distribution the merge of the streams' ones.
+    Its collapse episodes are tracked by a RecoveryTracker. The raw
+    interval reports are also added to `series`, if given (see
+    timeseries.IntervalSeries).
+    """
+
+    def __init__(self, series=None):
+        self.series = series
+        self.start = None
+        self.end = None
+        self.error = None
+        self.intervals = 0
+        self.elapsed = 0.0
+        self.retransmits = 0
+        self.throughput = RunningStats()
+        self.cwnd = RunningStats()
+        self.recovery = RecoveryTracker()
+        self.streams = {}
+
+    def feed(self, line):
+        """Ingest one line of output; returns the interval report it carried, if any."""
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return None
+        kind, data = event.get('event'), event.get('data')
+        if kind == 'interval':
+            self.add_interval(data)
+            return data
+        if kind == 'start':
+            self.start = data
+        elif kind == 'end':
+            self.end = data
+        elif kind == 'error':
+            self.error = data
+        return None
+
+    def add_interval(self, interval):
+        if self.series is not None:
+            self.series.add(interval)
+        self.intervals += 1
+        self.elapsed = interval['sum']['end']
+        self.retransmits += interval['sum'].get('retransmits', 0)
+        cwnd = sum(stream.get('snd_cwnd', 0) for stream in interval['streams'])
+        self.throughput.add(interval['sum']['bits_per_second'])
+        self.cwnd.add(cwnd)
+        self.recovery.add(interval['sum']['start'], interval['sum']['end'], interval['sum']['bits_per_second'], cwnd)
+        for stream in interval['streams']:
+            stats = self.streams.setdefault(stream['socket'], {
+                'bits_per_second': RunningStats(), 'rtt': RunningStats(), 'snd_cwnd': RunningStats()})
+            stats['bits_per_second'].add(stream['bits_per_second'])
+            if 'rtt' in stream:
+                stats['rtt'].add(stream['rtt'])
+            if 'snd_cwnd' in stream:
+                stats['snd_cwnd'].add(stream['snd_cwnd'])
+
+    @property
+    def rtt(self):
+        """RTT statistics of all the streams together."""
+        return merged(stats['rtt'] for stats in self.streams.values())
+
+    def statistics(self):
+        """Summary of the interval reports ingested so far."""
+        return {'intervals': self.intervals, 'retransmits': self.retransmits,
+                'bits_per_second': self.throughput.to_dict(), 'rtt': self.rtt.to_dict(),
+                'snd_cwnd': self.cwnd.to_dict(), 'recovery': self.recovery.statistics(),
+                'streams': [{'socket': socket, **{name: item.to_dict() for name, item in stats.items()}}
+                            for socket, stats in self.streams.items()]}
+
+    def document(self):
+        """The iperf3 JSON document, with 'interval_stats' in place of the 'intervals' list."""
+        document = {'start': self.start, 'end': self.end, 'interval_stats': self.statistics()}
+        if self.error is not None:
+            document['error'] = self.error
+        return document
+
+def run_iperf_client(h1, command, detector=None, timeout=None, log_file=None, series=None, started=None,
+                     test_started=None):
+    """Run an iperf3 client on h1 and return its JSON output and whether it converged.
+
+    When `command` uses --json-stream, the events are ingested as they
+    arrive by an IperfStream, copied to `log_file` if given, and the
+    returned output is the compact IperfStream.document(). Every interval
+    is also fed to the `detector`, if any: the client is interrupted as
+    soon as the flow is steady. The convergence flag is None without a
+    detector. The interval reports are added to `series`, if given, and
+    `started` is called with the pid of the client once it is running.
+    `test_started` is called when the client reports the start of the
+    test (the --json-stream 'start' event), from which the interval
+    times count; without --json-stream it is never called.
+
+    A client still running after `timeout` seconds is killed and
+    TimeoutError is raised.
+    """
+    client = h1.popen(command.split())
+    if started:
+        started(client.pid)
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        client.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.start()
+    try:
+        if "--json-stream" in command:
+            result = _read_iperf_stream(client, detector, log_file, series, test_started)
+        else:
+            result = client.communicate()[0].decode(), None
+            if series is not None:
+                try:
+                    for interval in json.loads(result[0])['intervals']:
+                        series.add(interval)
+                except (ValueError, KeyError):
+                    pass  # Reported by parse_iperf_result()
+    finally:
+        if timer:
+            timer.cancel()
+    if timed_out.is_set():
+        raise TimeoutError(f"iperf3 client on {h1} did not finish within {timeout}s")
+    return result
+
+def _read_iperf_stream(client, detector, log_file, series, test_started):
+    stream = IperfStream(series)
+    converged = False if detector else None
+    last_progress = 0
+    for line in client.stdout:
+        line = line.decode()
+        if log_file:
+            log_file.write(line)
+        interval = stream.feed(line)
+        if test_started and stream.start is not None:
+            test_started()
+            test_started = None
+        if interval is None:
+            continue
+        if stream.elapsed - last_progress >= 1:
+            # Live view of the test, at most once per second
+            last_progress = stream.elapsed
+            print(f"  {stream.elapsed:6.1f}s  {interval['sum']['bits_per_second'] / 1e9:7.2f} Gbps  "
+                  f"cwnd {stream.cwnd.max:.0f}  retransmits {stream.retransmits}")
+        if detector and not converged:
+            cwnd = sum(item.get('snd_cwnd', 0) for item in interval['streams'])
+            if detector.update(interval['sum']['bits_per_second'], cwnd):
+                converged = True
+                client.send_signal(signal.SIGINT)  # iperf3 still reports the end of the test
+    client.wait()
+    return json.dumps(stream.document()), converged
+
+def interval_statistics(iperf_data):
+    """Statistics of the interval reports of an iperf3 document (see IperfStream.statistics())."""
+    if 'interval_stats' in iperf_data:
+        # Streamed output: accumulated while the test ran
+        return iperf_data['interval_stats']
+    stream = IperfStream()
+    for interval in iperf_data['intervals']:
+        stream.add_interval(interval)
+    return stream.statistics()
+
+def parse_iperf_result(iperf_result, test_id, tcp_version, ip_version, avg_cpu_usage, max_bandwidth, converged=None):
+    """Extract the metrics of a test from the iperf3 JSON output.
+
+    `max_bandwidth` (bit/s) is the reference of the bandwidth efficiency.
+    `converged` tells whether the test was stopped at steady state (None
+    when steady-state detection is off). With several parallel streams the
+    RTT and cwnd metrics cover all of them, and the fairness of their
+    throughputs is reported. The recovery metrics come from the collapse
+    episodes of the interval reports (see RecoveryTracker). Raises
+    KeyError when the output lacks one of the expected fields.
+    """
+    iperf_data = json.loads(iperf_result)
+
+    # Verify and extract the relevant metrics
+    if converged:
+        # An interrupted client never receives the server's totals
+        throughput_bps = iperf_data['end']['sum_sent']['bits_per_second']
+    else:
+        throughput_bps = iperf_data['end']['sum_received']['bits_per_second']
+    throughput_gbps = round(throughput_bps / 1e9, 2)
+
+    retransmissions = iperf_data['end']['sum_sent']['retransmits']
+
+    # Per-stream totals (iperf3 -P)
+    senders = [stream['sender'] for stream in iperf_data['end']['streams']]
+    mean_rtts = [sender.get('mean_rtt', 0) for sender in senders]
+    mean_rtt = mean_rtts[0] if len(mean_rtts) == 1 else round(sum(mean_rtts) / len(mean_rtts), 2)
+    side = 'sender' if converged else 'receiver'
+    stream_throughputs = [stream[side]['bits_per_second'] for stream in iperf_data['end']['streams']]
+
+    # RTT distribution and collapse episodes over the interval reports of all streams
+    stats = interval_statistics(iperf_data)
+    rtt_stats = stats['rtt']
+    rtt_variance = round(rtt_stats.get('variance', 0), 2)
+
+    # Total Packets Sent (rounded)
+    total_bytes_sent = iperf_data['end']['sum_sent']['bytes']
+    tcp_mss = iperf_data['start']['tcp_mss_default']
+    total_packets_sent = round(total_bytes_sent / tcp_mss, 2)
+
+    packet_loss = "{:.2f}".format((retransmissions / total_packets_sent) * 100 if total_packets_sent > 0 else 0)
+    bandwidth_efficiency = round((throughput_bps / max_bandwidth) * 100, 2)
+
+    max_rtt = max(sender.get('max_rtt', 0) for sender in senders)
+    max_cwnd = max(sender.get('max_snd_cwnd', 0) for sender in senders)
+
+    cpu_sender = round(iperf_data['end']['cpu_utilization_percent']['host_total'], 2)
+    if converged:
+        # The interrupted client never received the server's report: remote_total is a placeholder 0
+        cpu_receiver = ''
+    else:
+        cpu_receiver = round(iperf_data['end']['cpu_utilization_percent']['remote_total'], 2)
+
+    # Metrics with ID to identify the test run
+    return {
+        'ID': test_id,
+        'TCP Version': tcp_version,
+        'IP Version': ip_version,
+        'Streams': len(senders),
+        'Throughput (Gbps)': throughput_gbps,
+        'Packet Loss (%)': packet_loss,
+        **recovery_metrics(stats['recovery']),
+        'Mean RTT (ms)': mean_rtt,
+        'RTT Variance (ms)': rtt_variance,
+        'Maximum RTT (ms)': max_rtt,
+        **{f'RTT p{p:g} (us)': round(rtt_stats[f'p{p:g}'], 2) if rtt_stats['count'] else 0 for p in PERCENTILES},
+        'Retransmissions': retransmissions,
+        'Total Packets Sent': total_packets_sent,
+        'Bandwidth Efficiency (%)': bandwidth_efficiency,
+        'Max cwnd (bytes)': max_cwnd,
+        **stream_fairness(stream_throughputs),
+        'CPU Sender (%)': cpu_sender,
+        'CPU Receiver (%)': cpu_receiver,
+        'CPU Usage Local (%)': avg_cpu_usage,
+        'Converged': '' if converged is None else converged
+    }
@@ -0,0 +1,132 @@
+"""Journal of the runs of a campaign, used to resume it after an interruption.
+
+Each scenario directory holds a journal.jsonl with one JSON record per
+line, appended (and synced to disk) as soon as something happens:
+
+    {"event": "run", "cell": ..., "run": 3, "metrics": {...}}
+    {"event": "failure", "cell": ..., "run": 4, "reason": "..."}
+    {"event": "quarantine", "cell": ..., "reason": "..."}
+    {"event": "finish", "cell": ..., "converged": true}
+
+"cell" identifies the (TCP version, IP version) cell together with the
+parameters its results depend on, so that runs recorded under another
+link configuration or duration are not mistaken for runs of this one.
+"""
+import json
+import os
+
+from .scenario import topology_key
+
+def cell_id(cell):
+    """Identity of a cell in the journal."""
+    # Single-stream cells keep the identity they had before the streams axis
+    streams = f"/{cell.streams}P" if cell.streams > 1 else ""
+    stagger = f"/stagger{cell.stagger:g}s" if cell.competitors else ""
+    trace = f"/trace-{cell.link_trace.name}" if cell.link_trace else ""
+    queue = f"/{cell.qdisc}x{cell.buffer_bdp:g}bdp" if cell.qdisc else ""
+    return (f"{cell.tcp_version}/{cell.ip_version}{streams}{stagger}{trace}{queue}/{cell.duration}s/"
+            f"{cell.max_bandwidth:g}/{topology_key(cell.links)}")
+
+class Journal:
+    """Append-only record of the runs of the cells written to one scenario directory."""
+
+    def __init__(self, path):
+        self.path = path
+        self.runs = {}
+        self.quarantined = {}
+        self.finished = set()
+        # A crash can leave the last line unterminated; the next record must start on a new line
+        self.unterminated = False
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    self.unterminated = not line.endswith("\n")
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        # A line cut short by a crash: everything before it is still valid
+                        continue
+
+    def _apply(self, record):
+        cell = record['cell']
+        if record['event'] == 'run':
+            self.runs.setdefault(cell, {})[record['run']] = record['metrics']
+        elif record['event'] == 'quarantine':
+            self.quarantined[cell] = record['reason']
+        elif record['event'] == 'finish':
+            self.finished.add(cell)
+
+    def _append(self, record):
+        self._apply(record)
+        with open(self.path, 'a') as f:
+            if self.unterminated:
+                f.write("\n")
+                self.unterminated = False
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def completed_runs(self, cell):
+        """Metrics of the runs of `cell` that already completed, by run id."""
+        return self.runs.get(cell_id(cell), {})
+
+    def is_quarantined(self, cell):
+        return cell_id(cell) in self.quarantined
+
+    def is_finished(self, cell):
+        """Whether an adaptive cell already reached its stopping decision."""
+        return cell_id(cell) in self.finished
+
+    def record_run(self, cell, run_id, metrics):
+        self._append({'event': 'run', 'cell': cell_id(cell), 'run': run_id, 'metrics': metrics})
+
+    def record_failure(self, cell, run_id, reason):
+        self._append({'event': 'failure', 'cell': cell_id(cell), 'run': run_id, 'reason': reason})
+
+    def quarantine(self, cell, reason):
+        self._append({'event': 'quarantine', 'cell': cell_id(cell), 'reason': reason})
+
+    def finish(self, cell, converged):
+        self._append({'event': 'finish', 'cell': cell_id(cell), 'converged': converged})
+
+class CampaignJournal:
+    """The journals of all the scenario directories a campaign writes to."""
+
+    def __init__(self):
+        self.journals = {}
+
+    def _journal(self, output_dir):
+        if output_dir not in self.journals:
+            self.journals[output_dir] = Journal(os.path.join(output_dir, "journal.jsonl"))
+        return self.journals[output_dir]
+
+    def _all(self, cell):
+        return [self._journal(output_dir) for output_dir in cell.output_dirs]
+
+    def completed_runs(self, cell):
+        """Runs completed in every directory of the cell (a merged cell may be new to one of them)."""
+        runs = [journal.completed_runs(cell) for journal in self._all(cell)]
+        return {run_id: metrics for run_id, metrics in runs[0].items()
+                if all(run_id in other for other in runs[1:])}
+
+    def is_quarantined(self, cell):
+        return any(journal.is_quarantined(cell) for journal in self._all(cell))
+
+    def is_finished(self, cell):
+        return all(journal.is_finished(cell) for journal in self._all(cell))
+
+    def record_run(self, cell, run_id, metrics):
+        for journal in self._all(cell):
+            journal.record_run(cell, run_id, metrics)
+
+    def record_failure(self, cell, run_id, reason):
+        for journal in self._all(cell):
+            journal.record_failure(cell, run_id, reason)
+
+    def quarantine(self, cell, reason):
+        for journal in self._all(cell):
+            journal.quarantine(cell, reason)
+
+    def finish(self, cell, converged):
+        for journal in self._all(cell):
+            journal.finish(cell, converged)
@@ -0,0 +1,136 @@
+"""Replay of link traces: time-varying conditions on the bottleneck during a test."""
+import subprocess
+import threading
+from time import monotonic
+
+from .scenario import delay_ms, has_htb
+from .stats import RunningStats
+from .timeseries import SampleSeries
+
+class LinkTraceReplayer:
+    """Applies the steps of a LinkTrace to the r1-r2 links of the paths while a test runs.
+
+    The links keep the qdiscs TCLink gave them: each step changes the rate
+    of the HTB class and the parameters of the netem qdisc in place, so
+    the packets in the queues are kept. Every router runs one `tc -batch`
+    process fed through a pipe, so an update costs a write instead of a
+    fork of tc. start() spawns those processes before the test; a thread
+    applies each step at its time after begin(), called when the iperf3
+    client reports the start of the test, so that the times of the trace
+    are those of the interval reports. The conditions actually applied
+    and their lag behind the schedule are recorded in a SampleSeries of
+    kind "link_trace" (sources "bw", "delay", "loss" and "lag", in Mbit/s,
+    ms, % and ms, and "loss model", 1 while a netem loss model replaces
+    the loss rate).
+    The [start, end] times of the loss model periods, the bursts of a
+    "loss_bursts" scenario, are kept in `bursts`. stop() restores the
+    conditions of `bottleneck`, the TCLink parameters of the links.
+    """
+
+    def __init__(self, paths, trace, bottleneck):
+        self.trace = trace
+        self.bottleneck = bottleneck
+        self.routers = list(dict.fromkeys(h1.routers for h1, h2 in paths))
+        self.base = (bottleneck.get('bw'), delay_ms(bottleneck.get('delay')) or 0, bottleneck.get('loss') or 0)
+        self.state = self.base
+        self.series = SampleSeries('link_trace')
+        self.lag = RunningStats()
+        self.bursts = []
+        self.processes = []
+        self.errors = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="link-trace", daemon=True)
+        self.start_time = None
+
+    def start(self):
+        for router in (router for routers in self.routers for router in routers):
+            process = router.popen(["tc", "-force", "-batch", "-"], stdin=subprocess.PIPE,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            self.processes.append((f"{router}-eth1", process))
+        return self
+
+    def begin(self):
+        """Start replaying the steps: time 0 of the trace is now."""
+        if self.start_time is None:
+            self.start_time = monotonic()
+            self.thread.start()
+
+    def stop(self):
+        """Stop the replay and restore the conditions of the bottleneck."""
+        self.stopped.set()
+        if self.start_time is not None:
+            self.thread.join()
+        self._apply(*self.base)
+        if self.bursts and self.bursts[-1][1] is None:
+            self.bursts[-1][1] = monotonic() - self.start_time
+        for intf, process in self.processes:
+            process.stdin.close()
+            errors = process.stderr.read().decode(errors="replace").strip()
+            process.wait()
+            if errors:
+                self.errors.append(f"{intf}: {errors}")
+        if self.errors:
+            print(f"Warning: link trace {self.trace.name} could not be applied: {'; '.join(self.errors)}")
+
+    def _run(self):
+        for time, bw, delay, loss in self.trace.steps:
+            if self.stopped.wait(max(0, self.start_time + time - monotonic())):
+                return
+            self._apply(*(value if value is not None else previous
+                          for value, previous in zip((bw, delay, loss), self.state)))
+            applied = monotonic() - self.start_time
+            self.lag.add((applied - time) * 1000)
+            for source, value in zip(('bw', 'delay', 'loss'), self.state):
+                if isinstance(value, (int, float)):
+                    self.series.add(applied, source, value)
+            if isinstance(self.state[2], str) != bool(self.bursts and self.bursts[-1][1] is None):
+                if isinstance(self.state[2], str):
+                    self.bursts.append([applied, None])
+                else:
+                    self.bursts[-1][1] = applied
+                self.series.add(applied, 'loss model', isinstance(self.state[2], str))
+            self.series.add(applied, 'lag', (applied - time) * 1000)
+
+    def _netem_parent(self):
+        """Parent of the netem qdisc in the qdisc tree TCLink builds (see TCIntf.config())."""
+        if self.bottleneck.get('enable_ecn') or self.bottleneck.get('enable_red'):
+            return "parent 6:"
+        return "parent 5:1" if has_htb(self.bottleneck) else "root"
+
+    def _apply(self, bw, delay, loss):
+        commands = []
+        if bw != self.state[0]:
+            commands.append(f"class change dev {{intf}} parent 5:0 classid 5:1 htb rate {bw:f}Mbit burst 15k")
+        if (delay, loss) != self.state[1:]:
+            netem = f"delay {delay:g}ms"
+            if self.bottleneck.get('jitter'):
+                netem += f" {self.bottleneck['jitter']}"
+            if isinstance(loss, str):
+                netem += f" loss {loss}"
+            elif loss:
+                netem += f" loss {loss:.5f}"
+            if self.bottleneck.get('max_queue_size'):
+                netem += f" limit {self.bottleneck['max_queue_size']}"
+            commands.append(f"qdisc change dev {{intf}} {self._netem_parent()} handle 10: netem {netem}")
+        self.state = (bw, delay, loss)
+        for intf, process in self.processes:
+            try:
+                process.stdin.write("".join(command.format(intf=intf) + "\n" for command in commands).encode())
+                process.stdin.flush()
+            except OSError as e:
+                self.errors.append(f"{intf}: {e}")
+
+    def summary(self):
+        return {'Link Trace Steps': self.lag.count,
+                'Link Trace Max Lag (ms)': round(self.lag.max, 2) if self.lag.count else ''}
+
+def start_link_trace(paths, cell):
+    """Start replaying the link trace of the cell on the paths: a list with the replayer, empty without trace."""
+    if not cell.link_trace:
+        return []
+    return [LinkTraceReplayer(paths, cell.link_trace, cell.links['bottleneck']).start()]
+
+def begin_link_trace(trace):
+    """Start the clock of the replayers of start_link_trace(), when the iperf3 test starts."""
+    for replayer in trace:
+        replayer.begin()
@@ -0,0 +1,193 @@
+"""Metric calculations, result datasets and the statistics of the adaptive mode."""
+from statistics import NormalDist
+import csv
+import math
+import os
+
+from .stats import RunningStats
+
+FIELDNAMES = [
+    'ID',
+    'TCP Version',
+    'IP Version',
+    'Streams',
+    'Competition',
+    'Flow',
+    'Start Offset (s)',
+    'Throughput (Gbps)',
+    'Packet Loss (%)',
+    'Total Recovery Time (s)',
+    'Loss Episodes',
+    'Unrecovered Episodes',
+    'Mean Recovery Time (s)',
+    'Max Recovery Time (s)',
+    'Injected Bursts',
+    'Detected Bursts',
+    'Unrecovered Bursts',
+    'Mean Burst Recovery Time (s)',
+    'Max Burst Recovery Time (s)',
+    'Mean RTT (ms)',
+    'RTT Variance (ms)',
+    'Maximum RTT (ms)',
+    'RTT p50 (us)',
+    'RTT p90 (us)',
+    'RTT p99 (us)',
+    'RTT p99.9 (us)',
+    'Retransmissions',
+    'Total Packets Sent',
+    'Bandwidth Efficiency (%)',
+    'Achievable Bandwidth (Gbps)',
+    'Max cwnd (bytes)',
+    'Jain Fairness Index',
+    'Stream Throughput Min (Gbps)',
+    'Stream Throughput Max (Gbps)',
+    'Stream Throughput CV (%)',
+    'Base RTT (ms)',
+    'Throughput Share (%)',
+    'RTT Inflation',
+    'Competition Fairness Index',
+    'CPU Sender (%)',
+    'CPU Receiver (%)',
+    'CPU Usage Local (%)',
+    'CPU Busiest Core (%)',
+    'CPU Softirq (%)',
+    'CPU iperf3 Client (%)',
+    'CPU iperf3 Server (%)',
+    'CPU ksoftirqd (%)',
+    'CPU Bound',
+    'Mean Pacing Rate (Gbps)',
+    'Mean Delivery Rate (Gbps)',
+    'ss Samples',
+    'ss Sample Interval (ms)',
+    'ss Sampler CPU (%)',
+    'tcp_probe Events',
+    'tcp_probe Lost Events',
+    'Link Trace Steps',
+    'Link Trace Max Lag (ms)',
+    'Probe Samples',
+    'Probe Loss (%)',
+    'Probe Base RTT (ms)',
+    'Queueing Delay p50 (ms)',
+    'Queueing Delay p90 (ms)',
+    'Queueing Delay p99 (ms)',
+    'Queueing Delay Max (ms)',
+    'Captured Packets',
+    'Wire Segments',
+    'Wire Retransmitted Segments',
+    'Wire Loss Gaps',
+    'Wire Lost Segments',
+    'Wire Loss (%)',
+    'Duplicate ACKs',
+    'SACK Blocks',
+    'Capture Dropped',
+    'Capture Wrapped',
+    'Server Wait (s)',
+    'Converged'
+]
+
+def jain_index(values):
+    """Jain's fairness index of the values: 1 when they are all equal, 1/n when one takes everything."""
+    square_sum = sum(value ** 2 for value in values)
+    return sum(values) ** 2 / (len(values) * square_sum) if square_sum else 1
+
+def stream_fairness(throughputs):
+    """Fairness and spread of the throughputs (bit/s) of the parallel streams of a test."""
+    stats = RunningStats()
+    for throughput in throughputs:
+        stats.add(throughput)
+    return {
+        'Jain Fairness Index': round(jain_index(throughputs), 4),
+        'Stream Throughput Min (Gbps)': round(stats.min / 1e9, 2),
+        'Stream Throughput Max (Gbps)': round(stats.max / 1e9, 2),
+        'Stream Throughput CV (%)': round(math.sqrt(stats.variance) / stats.mean * 100, 2) if stats.mean else 0,
+    }
+
+def competition_metrics(rows, base_rtt):
+    """Add the share of the bottleneck, RTT inflation and fairness of competing flows to their rows.
+
+    `base_rtt` is the RTT of the idle path in ms; the mean RTT of the rows
+    is in microseconds, as iperf3 reports it.
+    """
+    throughputs = [float(row['Throughput (Gbps)']) for row in rows]
+    total = sum(throughputs)
+    fairness = round(jain_index(throughputs), 4)
+    for row, throughput in zip(rows, throughputs):
+        row['Base RTT (ms)'] = base_rtt if base_rtt is not None else ''
+        row['Throughput Share (%)'] = round(throughput / total * 100, 2) if total else 0
+        row['RTT Inflation'] = round(row['Mean RTT (ms)'] / 1000 / base_rtt, 2) if base_rtt else ''
+        row['Competition Fairness Index'] = fairness
+    return rows
+
+def save_metrics(metrics, output_dir, ip_version, tcp_version):
+    """Append the metrics rows to the dataset of an IP version and TCP version in `output_dir`."""
+    output_filename = os.path.join(output_dir, f"dataset_{ip_version.lower()}_{tcp_version.lower()}.csv")
+    with open(output_filename, 'a', newline='') as csvfile:  # 'a' to append data without overwriting
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        if csvfile.tell() == 0:  # Write header only if file is empty
+            writer.writeheader()
+        writer.writerows(metrics)
+    print(f"Metrics saved to {output_filename}")
+
+# Metrics whose confidence interval decides when a cell has enough runs
+ADAPTIVE_METRICS = ['Throughput (Gbps)', 'Mean RTT (ms)', 'Retransmissions']
+
+# CI half-width that is narrow enough whatever the mean, for count metrics
+ABSOLUTE_TOLERANCES = {'Retransmissions': 1}
+
+def t_quantile(p, df):
+    """Quantile of Student's t distribution.
+
+    Cornish-Fisher expansion around the normal quantile, accurate to about
+    0.01 from 3 degrees of freedom on.
+    """
+    z = NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    return z + g1 / df + g2 / df ** 2 + g3 / df ** 3 + g4 / df ** 4
+
+def ci_half_width(values, confidence=0.95):
+    """Half-width of the confidence interval of the mean and the mean itself."""
+    n = len(values)
+    if n < 2:
+        return math.inf, (values[0] if values else 0)
+    mean = sum(values) / n
+    std = math.sqrt(sum((value - mean) ** 2 for value in values) / (n - 1))
+    return t_quantile((1 + confidence) / 2, n - 1) * std / math.sqrt(n), mean
+
+def relative_ci_half_width(values, confidence=0.95):
+    """Half-width of the confidence interval of the mean, relative to the mean."""
+    half_width, mean = ci_half_width(values, confidence)
+    if half_width == 0:
+        return 0
+    if mean == 0:
+        return math.inf
+    return half_width / abs(mean)
+
+def cell_converged(samples, target, confidence=0.95, metrics=ADAPTIVE_METRICS):
+    """Check whether the CI of every metric of a cell is narrower than `target` (relative).
+
+    A metric whose mean is close to 0, like the retransmissions of a
+    loss-free path, never gets a narrow relative CI: it is also narrow
+    enough within its ABSOLUTE_TOLERANCES.
+    """
+    for metric in metrics:
+        half_width, mean = ci_half_width([float(row[metric]) for row in samples], confidence)
+        if half_width > max(target * abs(mean), ABSOLUTE_TOLERANCES.get(metric, 0)):
+            return False
+    return True
+
+def save_adaptive_summary(output_dir, tcp_version, ip_version, samples, runs, converged, confidence, streams=1):
+    """Append how many runs a cell needed, and the final CI widths, to adaptive_summary.csv in `output_dir`."""
+    row = {'TCP Version': tcp_version, 'IP Version': ip_version, 'Streams': streams, 'Runs': runs,
+           'Valid Runs': len(samples), 'Converged': converged}
+    for metric in ADAPTIVE_METRICS:
+        width = relative_ci_half_width([float(sample[metric]) for sample in samples], confidence)
+        row[f'{metric} CI (%)'] = round(width * 100, 2) if math.isfinite(width) else ''
+    with open(os.path.join(output_dir, "adaptive_summary.csv"), 'a', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(row))
+        if csvfile.tell() == 0:  # Write header only if file is empty
+            writer.writeheader()
+        writer.writerow(row)
+    print(f"{tcp_version}/{ip_version}: {runs} runs, {'converged' if converged else 'run limit reached'}")
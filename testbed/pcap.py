@@ -0,0 +1,255 @@
+"""Header capture on the bottleneck and streaming analysis of the TCP segments that crossed it."""
+import glob
+import os
+import re
+import shutil
+import signal
+import struct
+import subprocess
+import tempfile
+from time import time
+
+from .timeseries import SampleSeries
+
+# Ethernet + IPv6 + TCP with a full options area fit in the snapshot
+SNAPLEN = 128
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+
+TCP_SYN = 0x02
+TCP_FIN = 0x01
+TCP_OPTION_MSS = 2
+TCP_OPTION_SACK = 5
+
+def read_pcap(f):
+    """Iterate over the (timestamp, frame) records of a pcap file, one record at a time."""
+    header = f.read(24)
+    if len(header) < 24:
+        return
+    magic = header[:4]
+    for endian in "<>":
+        number = struct.unpack(endian + "I", magic)[0]
+        if number in (0xa1b2c3d4, 0xa1b23c4d):
+            scale = 1e-6 if number == 0xa1b2c3d4 else 1e-9
+            break
+    else:
+        raise ValueError("not a pcap file")
+    record = struct.Struct(endian + "IIII")
+    while True:
+        fields = f.read(record.size)
+        if len(fields) < record.size:
+            return
+        seconds, fraction, captured, length = record.unpack(fields)
+        frame = f.read(captured)
+        if len(frame) < captured:
+            return  # Record cut short by the end of the capture
+        yield seconds + fraction * scale, frame
+
+def parse_tcp(frame):
+    """(source, destination, TCP header, payload length) of an Ethernet frame, or None if not TCP."""
+    offset = 14
+    ethertype = struct.unpack_from("!H", frame, 12)[0]
+    while ethertype in ETHERTYPE_VLAN and len(frame) >= offset + 4:
+        ethertype = struct.unpack_from("!H", frame, offset + 2)[0]
+        offset += 4
+    if ethertype == ETHERTYPE_IPV4 and len(frame) >= offset + 20:
+        header_length = (frame[offset] & 0x0F) * 4
+        if frame[offset + 9] != 6:
+            return None
+        total_length = struct.unpack_from("!H", frame, offset + 2)[0]
+        source, destination = frame[offset + 12:offset + 16], frame[offset + 16:offset + 20]
+        ip_payload = total_length - header_length
+        offset += header_length
+    elif ethertype == ETHERTYPE_IPV6 and len(frame) >= offset + 40:
+        if frame[offset + 6] != 6:
+            return None  # Extension headers are not used by the test flows
+        ip_payload = struct.unpack_from("!H", frame, offset + 4)[0]
+        source, destination = frame[offset + 8:offset + 24], frame[offset + 24:offset + 40]
+        offset += 40
+    else:
+        return None
+    if len(frame) < offset + 20:
+        return None
+    data_offset = (frame[offset + 12] >> 4) * 4
+    return source, destination, frame[offset:offset + data_offset], ip_payload - data_offset
+
+def tcp_options(header):
+    """(kind, value) of the options of a TCP header, as far as the snapshot holds them."""
+    options = header[20:]
+    index = 0
+    while index < len(options):
+        kind = options[index]
+        if kind == 0:
+            return
+        if kind == 1:
+            index += 1
+            continue
+        if index + 1 >= len(options) or options[index + 1] < 2:
+            return
+        length = options[index + 1]
+        yield kind, options[index + 2:index + length]
+        index += length
+
+def after(a, b):
+    """a comes after b in TCP sequence space (modulo 2^32)."""
+    return 0 < (a - b) % (1 << 32) < (1 << 31)
+
+class TcpTraceAnalyzer:
+    """Counts what the data and ACK segments of the flows to `port` show on the wire, one packet at a time.
+
+    Data segments larger than the MSS are GSO/GRO super-packets and count
+    as the number of MSS-sized segments they carry. A data segment
+    starting past the highest sequence number seen so far leaves a gap:
+    the segments in between were lost before the capture point. A segment
+    below it is a retransmission. An ACK carrying no data that repeats the
+    previous ACK of its flow is a duplicate ACK. Only per-flow state is
+    kept, so memory does not depend on the capture size. The gaps are
+    recorded in `series` (source "lost segments") at their time from
+    `start_time`.
+    """
+
+    def __init__(self, port, start_time=0.0, mss=1448):
+        self.port = port
+        self.start_time = start_time
+        self.default_mss = mss
+        self.flows = {}
+        self.series = SampleSeries('capture')
+        self.packets = 0
+        self.segments = 0
+        self.retransmitted = 0
+        self.gaps = 0
+        self.lost = 0
+        self.dup_acks = 0
+        self.sack_blocks = 0
+
+    def add(self, timestamp, frame):
+        tcp = parse_tcp(frame)
+        if tcp is None:
+            return
+        source, destination, header, payload = tcp
+        sport, dport, seq, ack = struct.unpack_from("!HHII", header)
+        flags = header[13]
+        self.packets += 1
+        if dport == self.port:
+            flow = self.flows.setdefault((source, sport), {'mss': self.default_mss, 'next': None, 'ack': None})
+            self._data(timestamp, flow, header, flags, seq, payload)
+        elif sport == self.port:
+            flow = self.flows.setdefault((destination, dport), {'mss': self.default_mss, 'next': None, 'ack': None})
+            self._ack(flow, header, flags, ack, payload)
+
+    def _data(self, timestamp, flow, header, flags, seq, payload):
+        if flags & TCP_SYN:
+            for kind, value in tcp_options(header):
+                if kind == TCP_OPTION_MSS and len(value) == 2:
+                    # The MSS option does not account for the timestamps the flows use
+                    flow['mss'] = struct.unpack("!H", value)[0] - 12
+            flow['next'] = (seq + 1) % (1 << 32)
+            return
+        if payload <= 0:
+            return
+        segments = -(-payload // flow['mss'])
+        self.segments += segments
+        end = (seq + payload) % (1 << 32)
+        if flow['next'] is None:
+            flow['next'] = end  # Flow already running when the capture started
+        elif after(seq, flow['next']):
+            lost = -(-((seq - flow['next']) % (1 << 32)) // flow['mss'])
+            self.gaps += 1
+            self.lost += lost
+            self.series.add(timestamp - self.start_time, 'lost segments', lost)
+            flow['next'] = end
+        elif after(end, flow['next']):
+            flow['next'] = end
+        else:
+            self.retransmitted += segments
+
+    def _ack(self, flow, header, flags, ack, payload):
+        sack = sum((len(value) // 8 for kind, value in tcp_options(header) if kind == TCP_OPTION_SACK))
+        self.sack_blocks += sack
+        if payload > 0 or flags & (TCP_SYN | TCP_FIN):
+            return
+        if ack == flow['ack']:
+            self.dup_acks += 1
+        flow['ack'] = ack
+
+    def summary(self):
+        return {
+            'Captured Packets': self.packets,
+            'Wire Segments': self.segments,
+            'Wire Retransmitted Segments': self.retransmitted,
+            'Wire Loss Gaps': self.gaps,
+            'Wire Lost Segments': self.lost,
+            'Wire Loss (%)': round(self.lost / (self.segments + self.lost) * 100, 4) if self.segments else '',
+            'Duplicate ACKs': self.dup_acks,
+            'SACK Blocks': self.sack_blocks,
+        }
+
+class PacketCapture:
+    """Captures the headers of a flow on the bottleneck into a bounded ring of pcap files.
+
+    tcpdump runs in r1's namespace on its end of the r1-r2 link, keeping
+    the first SNAPLEN bytes of the packets between `address` and `port`
+    in a ring of `files` files totalling `ring_mb` MB that it overwrites in
+    turn, so disk usage is bounded whatever the test length. Data packets are seen as
+    they leave r1's queue: the ones its qdiscs dropped show as sequence
+    gaps. When the test ends the ring is analysed by a TcpTraceAnalyzer,
+    one packet at a time, and deleted. If the ring wrapped, the counts only
+    cover the packets it still held, as "Capture Wrapped" tells.
+
+    start() raises OSError when tcpdump cannot capture.
+    """
+
+    def __init__(self, r1, address, port, ring_mb=64, files=4):
+        self.r1 = r1
+        self.intf = f"{r1}-eth1"
+        self.address = address
+        self.port = port
+        self.file_mb = max(1, ring_mb // files)
+        self.files = files
+        self.directory = None
+        self.process = None
+        self.start_time = None
+        self.analyzer = TcpTraceAnalyzer(port)
+        self.series = self.analyzer.series
+        self.dropped = None
+        self.written = 0
+
+    def start(self):
+        self.directory = tempfile.mkdtemp(prefix="testbed-capture-")
+        self.start_time = time()
+        self.process = self.r1.popen(
+            ["tcpdump", "-i", self.intf, "-n", "-p", "-s", str(SNAPLEN), "-B", "8192", "-Z", "root",
+             "-C", str(self.file_mb), "-W", str(self.files), "-w", os.path.join(self.directory, "ring.pcap"),
+             "tcp", "and", "host", self.address, "and", "port", str(self.port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        # tcpdump reports on stderr when it is listening, or why it could not
+        line = self.process.stderr.readline().decode(errors="replace").strip()
+        if "listening on" not in line:
+            self.process.wait()
+            shutil.rmtree(self.directory, ignore_errors=True)
+            raise OSError(line or f"tcpdump exited with status {self.process.returncode}")
+        return self
+
+    def stop(self):
+        """Stop the capture and analyse the ring."""
+        self.process.send_signal(signal.SIGINT)
+        errors = self.process.communicate()[1].decode(errors="replace")
+        match = re.search(r'(\d+) packets? dropped by kernel', errors)
+        self.dropped = int(match.group(1)) if match else None
+        match = re.search(r'(\d+) packets? captured', errors)
+        self.written = int(match.group(1)) if match else 0
+        self.analyzer.start_time = self.start_time
+        try:
+            for path in sorted(glob.glob(os.path.join(self.directory, "ring.pcap*")), key=os.path.getmtime):
+                with open(path, 'rb') as f:
+                    for timestamp, frame in read_pcap(f):
+                        self.analyzer.add(timestamp, frame)
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def summary(self):
+        return {**self.analyzer.summary(),
+                'Capture Dropped': '' if self.dropped is None else self.dropped,
+                'Capture Wrapped': int(self.analyzer.packets < self.written)}
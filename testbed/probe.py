@@ -0,0 +1,79 @@
+"""Latency under load: a low-rate ping probe sharing the bottleneck with the test flows."""
+import re
+import signal
+import subprocess
+import threading
+from time import time
+
+from .stats import RunningStats
+from .timeseries import SampleSeries
+from .topology import base_rtt
+
+REPLY = re.compile(r'^\[(\d+\.\d+)\].*\btime=([\d.]+) ms')
+TOTALS = re.compile(r'(\d+) packets transmitted, (\d+) (?:packets )?received')
+
+class LatencyProbe:
+    """Pings h2 from h1 every `interval` seconds while a test runs.
+
+    The probe crosses the bottleneck queue next to the test flows, so the
+    increase of its RTT over the RTT of the idle path (measured with
+    base_rtt() when the probe starts) is the queueing delay the flows
+    inflict on other traffic. The RTTs are kept in a SampleSeries of kind
+    "latency_probe" (source "rtt", in ms) and summary() reports the
+    percentiles of the queueing delay and the loss of the probe.
+    """
+
+    def __init__(self, h1, h2, ip_version, interval=0.01):
+        self.h1 = h1
+        self.h2 = h2
+        self.ip_version = ip_version
+        self.interval = interval
+        self.series = SampleSeries('latency_probe')
+        self.delay = RunningStats()
+        self.base = None
+        self.sent = self.received = 0
+        self.process = None
+        self.start_time = None
+        self.thread = threading.Thread(target=self._read, name="latency-probe", daemon=True)
+
+    def start(self):
+        self.base = base_rtt(self.h1, self.h2, self.ip_version)
+        family, address = ("-6", self.h2.ip6) if self.ip_version == "IPv6" else ("-4", self.h2.IP())
+        self.start_time = time()
+        self.process = self.h1.popen(["ping", family, "-D", "-n", "-i", str(self.interval), address],
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the probe; ping prints its totals on SIGINT."""
+        self.process.send_signal(signal.SIGINT)
+        self.thread.join()
+        self.process.wait()
+
+    def _read(self):
+        for line in self.process.stdout:
+            line = line.decode(errors="replace")
+            match = REPLY.match(line)
+            if match:
+                rtt = float(match.group(2))
+                self.series.add(float(match.group(1)) - self.start_time, 'rtt', rtt)
+                if self.base is not None:
+                    self.delay.add(max(0.0, rtt - self.base))
+                continue
+            match = TOTALS.search(line)
+            if match:
+                self.sent, self.received = int(match.group(1)), int(match.group(2))
+
+    def summary(self):
+        def percentile(p):
+            return round(self.delay.percentile(p), 3) if self.delay.count else ''
+        return {
+            'Probe Samples': len(self.series),
+            'Probe Loss (%)': round((1 - self.received / self.sent) * 100, 2) if self.sent else '',
+            'Probe Base RTT (ms)': self.base if self.base is not None else '',
+            'Queueing Delay p50 (ms)': percentile(50),
+            'Queueing Delay p90 (ms)': percentile(90),
+            'Queueing Delay p99 (ms)': percentile(99),
+            'Queueing Delay Max (ms)': round(self.delay.max, 3) if self.delay.count else '',
+        }
@@ -0,0 +1,130 @@
+"""Loss-recovery analysis: collapse episodes of a flow and the time it takes to recover from them."""
+from collections import deque
+
+# An episode starts when the throughput or cwnd falls below COLLAPSE_FRACTION
+# of its reference (the mean of the previous REFERENCE_SECONDS) and ends when
+# the throughput is back to RECOVERY_FRACTION of its reference at the start
+COLLAPSE_FRACTION = 0.5
+RECOVERY_FRACTION = 0.9
+REFERENCE_SECONDS = 2.0
+
+class RecoveryTracker:
+    """Finds the collapse episodes of a flow in its interval reports, in one pass.
+
+    The reference of an interval is the mean throughput and cwnd of the
+    intervals of the previous `reference` seconds that were not part of an
+    episode; no episode starts before a whole reference window was seen,
+    so slow start is not mistaken for a collapse. An episode starts with
+    the first interval whose throughput or cwnd falls below `collapse`
+    times its reference, and lasts until the first interval whose
+    throughput is back to `recovery` times the throughput reference at its
+    start: its recovery time is the time in between. Episodes still open at
+    the end of the test are unrecovered, and counted up to the end.
+    """
+
+    def __init__(self, collapse=COLLAPSE_FRACTION, recovery=RECOVERY_FRACTION, reference=REFERENCE_SECONDS):
+        self.collapse = collapse
+        self.recovery = recovery
+        self.reference = reference
+        self.window = deque()
+        self.sums = [0.0, 0.0]
+        self.first_start = None
+        self.end = 0.0
+        self.episode = None
+        self.episodes = []
+
+    def add(self, start, end, throughput, cwnd):
+        """Ingest the interval [start, end] of the flow: its throughput (bit/s) and cwnd (bytes)."""
+        if self.first_start is None:
+            self.first_start = start
+        self.end = end
+        if self.episode is not None:
+            episode_start, target = self.episode
+            if throughput < target:
+                return
+            self.episodes.append((episode_start, start))
+            self.episode = None
+        elif self.window and start - self.first_start >= self.reference:
+            throughput_reference, cwnd_reference = (total / len(self.window) for total in self.sums)
+            if throughput < self.collapse * throughput_reference or cwnd < self.collapse * cwnd_reference:
+                self.episode = (start, self.recovery * throughput_reference)
+                return
+        self.window.append((end, throughput, cwnd))
+        self.sums[0] += throughput
+        self.sums[1] += cwnd
+        while self.window[0][0] <= end - self.reference:
+            old_end, old_throughput, old_cwnd = self.window.popleft()
+            self.sums[0] -= old_throughput
+            self.sums[1] -= old_cwnd
+
+    def statistics(self):
+        """Episodes ([start, end], end None when unrecovered) and their recovery times in seconds."""
+        episodes = [[start, end] for start, end in self.episodes]
+        if self.episode is not None:
+            episodes.append([self.episode[0], None])
+        times = [(end if end is not None else self.end) - start for start, end in episodes]
+        return {'episodes': episodes, 'recovery_times': times,
+                'unrecovered': sum(end is None for start, end in episodes)}
+
+def recovery_metrics(statistics):
+    """Metrics columns of the statistics of a RecoveryTracker."""
+    times = statistics['recovery_times']
+    return {
+        'Total Recovery Time (s)': round(sum(times), 2),
+        'Loss Episodes': len(times),
+        'Unrecovered Episodes': statistics['unrecovered'],
+        'Mean Recovery Time (s)': round(sum(times) / len(times), 3) if times else '',
+        'Max Recovery Time (s)': round(max(times), 3) if times else '',
+    }
+
+def flow_intervals(series):
+    """(start, end, throughput, cwnd) of the intervals of an IntervalSeries, summed over its streams."""
+    columns = series.columns
+    intervals = []
+    for time, throughput, cwnd in zip(columns['time'], columns['bits_per_second'], columns['snd_cwnd']):
+        if intervals and intervals[-1][1] == time:
+            start, end, total, total_cwnd = intervals[-1]
+            intervals[-1] = (start, end, total + throughput, total_cwnd + cwnd)
+        else:
+            intervals.append((intervals[-1][1] if intervals else 0.0, time, throughput, cwnd))
+    return intervals
+
+def burst_recovery(series, bursts, recovery=RECOVERY_FRACTION, reference=REFERENCE_SECONDS):
+    """Recovery of a flow from loss bursts injected at known times, the ground truth of RecoveryTracker.
+
+    `bursts` holds the [start, end] times of the bursts, on the clock of
+    the interval series. The recovery time of a burst runs from its end
+    to the start of the first interval ending after it whose throughput
+    is back to `recovery` times the mean throughput of the `reference`
+    seconds before the burst (0 when the burst did not slow the flow
+    down). A burst is detected when RecoveryTracker opened an episode
+    between its start (give or take an interval) and `reference` seconds
+    after its end.
+    """
+    intervals = flow_intervals(series)
+    tracker = RecoveryTracker(recovery=recovery, reference=reference)
+    for interval in intervals:
+        tracker.add(*interval)
+    starts = [start for start, end in tracker.statistics()['episodes']]
+    step = max((end - start for start, end, throughput, cwnd in intervals), default=0)
+
+    times, unrecovered, detected = [], 0, 0
+    for burst_start, burst_end in bursts:
+        burst_end = burst_end if burst_end is not None else tracker.end
+        before = [throughput for start, end, throughput, cwnd in intervals
+                  if burst_start - reference < end <= burst_start]
+        target = recovery * sum(before) / len(before) if before else 0
+        recovered = next((start for start, end, throughput, cwnd in intervals
+                          if end > burst_end and throughput >= target), None)
+        if recovered is None:
+            unrecovered += 1
+        else:
+            times.append(max(0.0, recovered - burst_end))
+        detected += any(burst_start - step <= start <= burst_end + reference for start in starts)
+    return {
+        'Injected Bursts': len(bursts),
+        'Detected Bursts': detected,
+        'Unrecovered Bursts': unrecovered,
+        'Mean Burst Recovery Time (s)': round(sum(times) / len(times), 3) if times else '',
+        'Max Burst Recovery Time (s)': round(max(times), 3) if times else '',
+    }
@@ -0,0 +1,169 @@
+"""Results store: one typed SQLite dataset for a whole campaign.
+
+Every successful run becomes one row of the `runs` table, for each
+scenario its cell writes to, with the metrics of FIELDNAMES as typed
+columns (see column_name()) next to the identity of the run:
+
+    scenario | cell | tcp_version | ip_version | run_id | flow | streams | duration | max_bandwidth_gbps |
+    bottleneck_bw_mbps | bottleneck_delay_ms | bottleneck_loss_pct | qdisc | buffer_bdp | throughput_gbps | ...
+
+The bottleneck columns give the operating point of the run (see the
+"sweep" of scenario.py), and qdisc/buffer_bdp its queue (NULL for
+TCLink's).
+
+A competition run has a row per flow (1, 2, ...), with the flow's own
+algorithm as tcp_version and the pairing in `competition`; the other
+runs have flow 0.
+
+Rows are buffered and written in one transaction at checkpoints (the end
+of each batch of cells, or every `batch_size` rows). The journal remains
+the durable record of the campaign: rows it has but the store lost in a
+crash are added again when the campaign resumes.
+
+    import sqlite3
+    rows = sqlite3.connect("results.sqlite").execute(
+        "SELECT tcp_version, AVG(throughput_gbps) FROM runs WHERE scenario = ? GROUP BY tcp_version",
+        ("scenario-II",)).fetchall()
+"""
+import os
+import re
+import sqlite3
+
+from .journal import cell_id
+from .metrics import FIELDNAMES
+from .scenario import delay_ms
+
+# Columns identifying a run, before the metrics
+KEY_COLUMNS = [
+    ('scenario', 'TEXT NOT NULL'),
+    ('cell', 'TEXT NOT NULL'),
+    ('tcp_version', 'TEXT NOT NULL'),
+    ('ip_version', 'TEXT NOT NULL'),
+    ('run_id', 'INTEGER NOT NULL'),
+    ('flow', 'INTEGER NOT NULL DEFAULT 0'),
+    ('streams', 'INTEGER'),
+    ('duration', 'REAL'),
+    ('max_bandwidth_gbps', 'REAL'),
+    ('bottleneck_bw_mbps', 'REAL'),
+    ('bottleneck_delay_ms', 'REAL'),
+    ('bottleneck_loss_pct', 'REAL'),
+    ('qdisc', 'TEXT'),
+    ('buffer_bdp', 'REAL'),
+]
+
+# SQL type of the metrics that are not REAL
+METRIC_TYPES = {
+    'Competition': 'TEXT',
+    'Loss Episodes': 'INTEGER',
+    'Unrecovered Episodes': 'INTEGER',
+    'Injected Bursts': 'INTEGER',
+    'Detected Bursts': 'INTEGER',
+    'Unrecovered Bursts': 'INTEGER',
+    'Retransmissions': 'INTEGER',
+    'Max cwnd (bytes)': 'INTEGER',
+    'Converged': 'INTEGER',
+    'CPU Bound': 'INTEGER',
+    'ss Samples': 'INTEGER',
+    'tcp_probe Events': 'INTEGER',
+    'tcp_probe Lost Events': 'INTEGER',
+    'Link Trace Steps': 'INTEGER',
+    'Probe Samples': 'INTEGER',
+    'Captured Packets': 'INTEGER',
+    'Wire Segments': 'INTEGER',
+    'Wire Retransmitted Segments': 'INTEGER',
+    'Wire Loss Gaps': 'INTEGER',
+    'Wire Lost Segments': 'INTEGER',
+    'Duplicate ACKs': 'INTEGER',
+    'SACK Blocks': 'INTEGER',
+    'Capture Dropped': 'INTEGER',
+    'Capture Wrapped': 'INTEGER',
+}
+
+# Fields of the metrics rows already stored as key columns
+KEY_FIELDS = {'ID', 'TCP Version', 'IP Version', 'Flow', 'Streams'}
+
+def column_name(field):
+    """SQL column of a metrics field: 'Packet Loss (%)' -> packet_loss_pct, 'RTT p99.9 (us)' -> rtt_p99_9_us."""
+    name = field.lower().replace('%', 'pct')
+    return re.sub(r'[^a-z0-9]+', '_', name).strip('_')
+
+def metric_columns():
+    """(field, column, SQL type) of the stored metrics."""
+    return [(field, column_name(field), METRIC_TYPES.get(field, 'REAL'))
+            for field in FIELDNAMES if field not in KEY_FIELDS]
+
+def operating_point(links):
+    """Bandwidth (Mbit/s), delay (ms) and loss (%) of the bottleneck link."""
+    bottleneck = links['bottleneck']
+    return [bottleneck.get('bw'), delay_ms(bottleneck.get('delay')), bottleneck.get('loss')]
+
+def to_sql(value, sql_type):
+    """Typed value of a metric; '' and None (not measured) become NULL."""
+    if value is None or value == '':
+        return None
+    if sql_type == 'INTEGER':
+        return int(float(value))
+    if sql_type == 'TEXT':
+        return str(value)
+    return float(value)
+
+class ResultsStore:
+    """Batched writer of the `runs` table of a results database."""
+
+    def __init__(self, path, batch_size=64):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.metrics = metric_columns()
+        # Several campaigns (run_parallel.py) may write to the same database
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        columns = KEY_COLUMNS + [(column, sql_type) for field, column, sql_type in self.metrics]
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS runs ({', '.join(f'{name} {sql_type}' for name, sql_type in columns)}, "
+                f"PRIMARY KEY (scenario, cell, run_id, flow))")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS runs_by_cell ON runs (scenario, tcp_version, ip_version, run_id)")
+            # Metrics added since the database was created
+            table = self.connection.execute("PRAGMA table_info(runs)").fetchall()
+            existing = {row[1] for row in table}
+            for name, sql_type in columns:
+                if name not in existing:
+                    self.connection.execute(f"ALTER TABLE runs ADD COLUMN {name} {sql_type}")
+            if 'flow' not in {row[1] for row in table if row[5]}:
+                print(f"Warning: {self.path} predates competition runs, their flows would overwrite "
+                      f"each other there; use a new --results database for them")
+
+    def add(self, cell, run_id, row):
+        """Queue the metrics row of a run, once for every scenario of the cell.
+
+        The row of a competition run is the list of the rows of its flows.
+        """
+        for row in row if isinstance(row, list) else [row]:
+            identity = [cell_id(cell), row.get('TCP Version') or cell.tcp_version, cell.ip_version, run_id,
+                        row.get('Flow') or 0, cell.streams, cell.duration, cell.max_bandwidth / 1e9,
+                        *operating_point(cell.links), cell.qdisc, cell.buffer_bdp]
+            values = [to_sql(row.get(field), sql_type) for field, column, sql_type in self.metrics]
+            for output_dir in cell.output_dirs:
+                self.pending.append([os.path.basename(output_dir)] + identity + values)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the queued rows in one transaction."""
+        if not self.pending:
+            return
+        columns = [name for name, sql_type in KEY_COLUMNS] + [column for field, column, sql_type in self.metrics]
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
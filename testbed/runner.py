@@ -0,0 +1,555 @@
+"""Runs the cells of the job matrix on Mininet topologies."""
+from concurrent.futures import ThreadPoolExecutor
+import os
+from time import monotonic, sleep
+
+from .calibration import Calibration, ceiling_metrics
+from .cpu import CpuSampler
+from .iperf import (SteadyStateDetector, configure_tcp_version, iperf_client_command, iperf_port, load_tcp_module,
+                    parse_iperf_result, run_iperf_client, start_iperf_server, stop_iperf_servers)
+from .journal import CampaignJournal
+from .linktrace import begin_link_trace, start_link_trace
+from .metrics import cell_converged, competition_metrics, save_adaptive_summary, save_metrics
+from .pcap import PacketCapture
+from .probe import LatencyProbe
+from .recovery import burst_recovery
+from .results import ResultsStore
+from .scenario import batch_cells, group_by_topology, senders
+from .sockets import SocketSampler
+from .timeseries import IntervalSeries, TimeSeriesStore
+from .tracing import TcpProbeCapture
+from .topology import (base_rtt, check_network_health, cleanup, configure_queue, create_topology,
+                       reset_between_runs)
+
+def stream_interval(args, cell):
+    """Reporting interval of the iperf3 clients of a cell, or None when they report once at exit.
+
+    The clients of a cell with a link trace always stream their reports:
+    the trace starts with the test they report (see LinkTraceReplayer).
+    """
+    return args.report_interval if args.json_stream or args.steady_state or cell.link_trace else None
+
+def new_detector(args):
+    """A steady-state detector for one iperf3 client, or None without --steady-state."""
+    if not args.steady_state:
+        return None
+    return SteadyStateDetector(max(1, round(args.steady_window / args.report_interval)), args.steady_tolerance)
+
+def measure_metrics(h1, h2, cell, test_id, args, timeseries=None, ceiling=None):
+    """Measure TCP performance metrics of a cell, logging the iperf3 output to its log file.
+
+    CPU usage, the optional samplers and the link trace of the cell run
+    for the whole test (see start_cpu_sampler(), start_path_samplers() and
+    start_link_trace()); `ceiling` is the achievable bandwidth of the path
+    (bit/s), if calibrated. Returns the metrics rows that could be parsed,
+    also saved with --csv and, with their series, to `timeseries`.
+    """
+    tcp_version, ip_version = cell.tcp_version, cell.ip_version
+    output_log = os.path.join(cell.output_dirs[0], "full_output.log")
+    print(f"Starting TCP performance tests for {tcp_version} with {ip_version}...")
+
+    # Configure TCP version and IP version
+    configure_tcp_version(h1, tcp_version)
+    configure_tcp_version(h2, tcp_version)
+
+    # Make sure the iperf server on h2 is listening
+    server_wait = start_iperf_server(h2, ip_version)
+
+    metrics = []
+    series = IntervalSeries()
+
+    # Open log file for writing
+    with open(output_log, 'w') as log_file:
+        # Run iperf test from h1 to h2
+        print("Running iperf test...")
+        log_file.write(f"Running iperf test for {tcp_version} with {ip_version}...\n")
+
+        # Sample CPU usage (and socket state) for the whole test
+        cpu = start_cpu_sampler([(h2, ip_version, "iperf3 server")], args)
+        samplers = start_path_samplers(h1, h2, ip_version, args)
+
+        command = iperf_client_command(h1, h2, ip_version, cell.duration,
+                                       stream_interval=stream_interval(args, cell), streams=cell.streams)
+        trace = start_link_trace([(h1, h2)], cell)
+        samplers += trace
+        try:
+            iperf_result, converged = run_iperf_client(h1, command, new_detector(args),
+                                                       cell.duration + args.run_timeout, log_file, series,
+                                                       lambda pid: cpu.watch("iperf3 client", pid),
+                                                       lambda: begin_link_trace(trace))
+        except TimeoutError as e:
+            iperf_result, converged = "", None
+            log_file.write(f"Error: {e}\n")
+        finally:
+            cpu.stop()
+            for sampler in samplers:
+                sampler.stop()
+        samples_summary = samplers_summary(cpu.summary(), samplers)
+
+        # Write full output to log file
+        log_file.write(iperf_result)
+        log_file.write("\n")
+
+        # Parse results
+        try:
+            metrics.append(parse_iperf_result(iperf_result, test_id, tcp_version, ip_version,
+                                              samples_summary['CPU Usage Local (%)'], ceiling or cell.max_bandwidth,
+                                              converged))
+            metrics[-1].update(samples_summary)
+            metrics[-1].update(ceiling_metrics(metrics[-1], cell.links, ceiling))
+            metrics[-1].update(bursts_summary(series, samplers))
+            metrics[-1]['Server Wait (s)'] = server_wait
+        except KeyError as e:
+            log_file.write(f"Error: Missing key {str(e)} in iperf result.\n")
+        except ValueError as e:
+            log_file.write(f"Error: Invalid iperf result ({e}).\n")
+
+    # Write metrics to CSV file
+    if args.csv:
+        for output_dir in cell.output_dirs:
+            save_metrics(metrics, output_dir, ip_version, tcp_version)
+    if metrics and timeseries is not None:
+        timeseries.append(cell, test_id, series)
+        timeseries.append(cell, test_id, cpu.series)
+        for sampler in samplers:
+            timeseries.append(cell, test_id, sampler.series)
+    print(f"Full output saved to {output_log}")
+    return metrics
+
+def start_cpu_sampler(servers, args):
+    """Start sampling CPU usage, watching the iperf3 server of every (h2, IP version, label)."""
+    cpu = CpuSampler(args.cpu_interval)
+    for h2, ip_version, label in servers:
+        server = getattr(h2, "iperf_servers", {}).get(ip_version)
+        if server is not None and server.process is not None:
+            cpu.watch(label, server.process.pid)
+    return cpu.start()
+
+def start_path_samplers(h1, h2, ip_version, args):
+    """Start the optional samplers of a path: ss polling, tcp_probe capture, packet capture and the latency probe."""
+    samplers = []
+    if args.latency_probe:
+        # First, so that the base RTT is measured before the other samplers load the path
+        samplers.append(LatencyProbe(h1, h2, ip_version, args.latency_probe).start())
+    if args.ss_interval:
+        samplers.append(SocketSampler(h1, iperf_port(ip_version), args.ss_interval).start())
+    if args.tcp_probe:
+        address = h1.ip6 if ip_version == "IPv6" else h1.IP()
+        try:
+            samplers.append(TcpProbeCapture(h1, address, iperf_port(ip_version)).start())
+        except OSError as e:
+            # tracefs is often missing or read-only in containers: keep measuring without it
+            print(f"Warning: tcp_probe capture unavailable ({e}), continuing without it")
+            args.tcp_probe = False
+    if args.capture:
+        address = h1.ip6 if ip_version == "IPv6" else h1.IP()
+        try:
+            samplers.append(PacketCapture(h1.routers[0], address, iperf_port(ip_version), args.capture).start())
+        except OSError as e:
+            print(f"Warning: packet capture unavailable ({e}), continuing without it")
+            args.capture = None
+    return samplers
+
+def samplers_summary(summary, samplers):
+    """The CPU summary of a test extended with the summaries of its optional samplers."""
+    for sampler in samplers:
+        summary.update(sampler.summary())
+    return summary
+
+def bursts_summary(series, samplers, offset=0):
+    """Recovery of a flow from the loss bursts injected by the link trace among `samplers`.
+
+    The flow of `series` started `offset` seconds after the trace.
+    """
+    bursts = [[start - offset, end - offset] for sampler in samplers
+              for start, end in getattr(sampler, 'bursts', []) if start >= offset]
+    return burst_recovery(series, bursts) if bursts else {}
+
+def run_iperf_client_or_timeout(*args):
+    """run_iperf_client() returning an empty output instead of raising on timeout."""
+    try:
+        return run_iperf_client(*args)
+    except TimeoutError as e:
+        print(f"Error: {e}")
+        return "", None
+
+def measure_metrics_concurrent(paths, cells, test_id, args, timeseries=None, ceiling=None):
+    """Measure several cells at the same time, one per isolated path.
+
+    The cells differ only by TCP version: `cells[i]` runs on `paths[i]`,
+    its algorithm selected per socket with iperf3 --congestion. Each cell
+    is measured and saved as in measure_metrics(), sharing the CPU
+    sampler. Returns the metrics rows that could be parsed.
+    """
+    ip_version = cells[0].ip_version
+    output_log = os.path.join(cells[0].output_dirs[0], "full_output.log")
+    print(f"Starting concurrent TCP performance tests for "
+          f"{', '.join(cell.tcp_version for cell in cells)} with {ip_version}...")
+    paths = paths[:len(cells)]
+
+    for cell in cells:
+        load_tcp_module(cell.tcp_version)
+    server_waits = [start_iperf_server(h2, ip_version) for h1, h2 in paths]
+    all_metrics = []
+    series = [IntervalSeries() for cell in cells]
+
+    with open(output_log, 'w') as log_file:
+        print("Running iperf tests...")
+        labels = [(f"iperf3 client {index}", f"iperf3 server {index}") for index in range(1, len(paths) + 1)]
+        cpu = start_cpu_sampler([(h2, ip_version, server) for (h1, h2), (client, server) in zip(paths, labels)], args)
+        samplers = [start_path_samplers(h1, h2, ip_version, args) for h1, h2 in paths]
+        traces = [[] for cell in cells]
+
+        try:
+            for (h1, h2), cell, path_samplers, trace in zip(paths, cells, samplers, traces):
+                trace += start_link_trace([(h1, h2)], cell)
+                path_samplers += trace
+            with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+                clients = [executor.submit(run_iperf_client_or_timeout, h1,
+                                           iperf_client_command(h1, h2, ip_version, cell.duration, cell.tcp_version,
+                                                                stream_interval(args, cell), cell.streams),
+                                           new_detector(args), cell.duration + args.run_timeout, None, cell_series,
+                                           lambda pid, client=client: cpu.watch(client, pid),
+                                           lambda trace=trace: begin_link_trace(trace))
+                           for (h1, h2), cell, cell_series, (client, server), trace
+                           in zip(paths, cells, series, labels, traces)]
+                results = [client.result() for client in clients]
+        finally:
+            cpu.stop()
+            for sampler in sum(samplers, []):
+                sampler.stop()
+
+        for cell, (iperf_result, converged), server_wait, cell_series, (client, server), path_samplers in zip(
+                cells, results, server_waits, series, labels, samplers):
+            samples_summary = samplers_summary(cpu.summary(client, server), path_samplers)
+            tcp_version = cell.tcp_version
+            log_file.write(f"Running iperf test for {tcp_version} with {ip_version}...\n")
+            log_file.write(iperf_result)
+            log_file.write("\n")
+            try:
+                metrics = [parse_iperf_result(iperf_result, test_id, tcp_version, ip_version,
+                                              samples_summary['CPU Usage Local (%)'], ceiling or cell.max_bandwidth,
+                                              converged)]
+                metrics[0].update(samples_summary)
+                metrics[0].update(ceiling_metrics(metrics[0], cell.links, ceiling))
+                metrics[0].update(bursts_summary(cell_series, path_samplers))
+                metrics[0]['Server Wait (s)'] = server_wait
+            except KeyError as e:
+                log_file.write(f"Error: Missing key {str(e)} in iperf result.\n")
+                metrics = []
+            except ValueError as e:
+                log_file.write(f"Error: Invalid iperf result ({e}).\n")
+                metrics = []
+            if args.csv:
+                for output_dir in cell.output_dirs:
+                    save_metrics(metrics, output_dir, ip_version, tcp_version)
+            if metrics and timeseries is not None:
+                timeseries.append(cell, test_id, cell_series)
+                timeseries.append(cell, test_id, cpu.series)
+                for sampler in path_samplers:
+                    timeseries.append(cell, test_id, sampler.series)
+            all_metrics.extend(metrics)
+
+    print(f"Full output saved to {output_log}")
+    return all_metrics
+
+def run_iperf_client_at(start, *args):
+    """run_iperf_client_or_timeout() once the monotonic clock reaches `start`."""
+    sleep(max(0, start - monotonic()))
+    return run_iperf_client_or_timeout(*args)
+
+def measure_competition(paths, cell, test_id, args, timeseries=None, ceiling=None):
+    """Measure the flows of a competition cell, which share the bottleneck of one path.
+
+    Flow `i` runs `cell.competitors[i]` from sender `paths[i]`, starts
+    `i * stagger` seconds after the first one and runs until the end of
+    the test. Each flow gets a metrics row, completed by
+    competition_metrics(). Returns the rows of the flows, or an empty list
+    when any of them failed.
+    """
+    ip_version = cell.ip_version
+    output_log = os.path.join(cell.output_dirs[0], "full_output.log")
+    print(f"Starting competition test of {', '.join(cell.competitors)} with {ip_version}...")
+    paths = paths[:len(cell.competitors)]
+
+    for tcp_version in set(cell.competitors):
+        load_tcp_module(tcp_version)
+    server_waits = [start_iperf_server(h2, ip_version) for h1, h2 in paths]
+    # The path is idle now: its RTT is the reference of the RTT inflation
+    rtt = base_rtt(*paths[0], ip_version)
+    offsets = [index * cell.stagger for index in range(len(paths))]
+    series = [IntervalSeries() for path in paths]
+    rows = []
+
+    with open(output_log, 'w') as log_file:
+        print("Running iperf tests...")
+        labels = [(f"iperf3 client {index}", f"iperf3 server {index}") for index in range(1, len(paths) + 1)]
+        cpu = start_cpu_sampler([(h2, ip_version, server) for (h1, h2), (client, server) in zip(paths, labels)], args)
+        samplers = [start_path_samplers(h1, h2, ip_version, args) for h1, h2 in paths]
+
+        trace = start_link_trace(paths[:1], cell)
+        start = monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+                clients = [executor.submit(run_iperf_client_at, start + offset, h1,
+                                           iperf_client_command(h1, h2, ip_version, cell.duration - offset,
+                                                                tcp_version, stream_interval(args, cell),
+                                                                cell.streams),
+                                           None, cell.duration + args.run_timeout, None, flow_series,
+                                           lambda pid, client=client: cpu.watch(client, pid),
+                                           (lambda: begin_link_trace(trace)) if flow == 1 else None)
+                           for flow, ((h1, h2), tcp_version, offset, flow_series, (client, server))
+                           in enumerate(zip(paths, cell.competitors, offsets, series, labels), 1)]
+                results = [client.result() for client in clients]
+        finally:
+            cpu.stop()
+            for sampler in sum(samplers, trace):
+                sampler.stop()
+
+        for flow, (tcp_version, offset, (iperf_result, converged), server_wait, (client, server),
+                   path_samplers, flow_series) in enumerate(zip(cell.competitors, offsets, results, server_waits,
+                                                                labels, samplers, series), 1):
+            samples_summary = samplers_summary(cpu.summary(client, server), path_samplers)
+            log_file.write(f"Running iperf test for flow {flow} ({tcp_version}, +{offset:g}s) with {ip_version}...\n")
+            log_file.write(iperf_result)
+            log_file.write("\n")
+            try:
+                row = parse_iperf_result(iperf_result, test_id, tcp_version, ip_version,
+                                         samples_summary['CPU Usage Local (%)'], ceiling or cell.max_bandwidth,
+                                         converged)
+            except KeyError as e:
+                log_file.write(f"Error: Missing key {str(e)} in iperf result.\n")
+                continue
+            except ValueError as e:
+                log_file.write(f"Error: Invalid iperf result ({e}).\n")
+                continue
+            row.update(samplers_summary(samples_summary, trace))
+            row.update(bursts_summary(flow_series, trace, offset))
+            row.update({'Competition': cell.tcp_version, 'Flow': flow, 'Start Offset (s)': offset,
+                        'Server Wait (s)': server_wait})
+            rows.append(row)
+
+    # The shares only make sense with every flow of the run
+    if len(rows) < len(paths):
+        rows = []
+    competition_metrics(rows, rtt)
+    # The flows are CPU- or network-bound together
+    total = sum(row['Throughput (Gbps)'] for row in rows)
+    for row in rows:
+        row.update(ceiling_metrics(row, cell.links, ceiling, total))
+    if args.csv:
+        for output_dir in cell.output_dirs:
+            save_metrics(rows, output_dir, ip_version, cell.tcp_version)
+    if rows and timeseries is not None:
+        timeseries.append(cell, test_id, cpu.series)
+        for sampler in trace:
+            timeseries.append(cell, test_id, sampler.series)
+        for flow, (flow_series, path_samplers) in enumerate(zip(series, samplers), 1):
+            timeseries.append(cell, test_id, flow_series, flow)
+            for sampler in path_samplers:
+                timeseries.append(cell, test_id, sampler.series, flow)
+    print(f"Full output saved to {output_log}")
+    return rows
+
+class Testbed:
+    """The topology the runs of a group of cells execute on.
+
+    Without --reuse-topology a new topology is created for every run and
+    released after it; with it, the topology is reset and reused as long
+    as it passes the health check, and moved to the operating point and
+    queue of the next cells by reconfiguring its bottleneck in place.
+    """
+
+    def __init__(self, links, args, senders=1):
+        self.links = links
+        self.args = args
+        self.senders = senders
+        self.queue = None
+        self.net = None
+        self.paths = None
+
+    def prepare(self, cell):
+        """Return the (h1, h2) paths of a topology with the links and queue of `cell`, ready for the next run."""
+        if self.net is not None:
+            # Also moves the bottleneck to the operating point of the cell
+            reset_between_runs(self.paths, cell.links['bottleneck'])
+            self.links, self.queue = cell.links, None
+            self.configure_queue(cell)
+            if check_network_health(self.paths):
+                return self.paths
+            self.close()
+        self.links, self.queue = cell.links, None
+        # Competition cells run alone, on the senders of a single path
+        pairs = self.args.pairs if self.senders == 1 else 1
+        self.net, self.paths = create_topology(self.links, self.args.prefix, pairs, self.senders)
+        self.configure_queue(cell)
+        if self.args.reuse_topology and not check_network_health(self.paths):
+            self.close()
+            raise RuntimeError("Freshly created topology failed the health check")
+        return self.paths
+
+    def configure_queue(self, cell):
+        """Give the bottleneck the queue discipline and buffer of the cell, if it does not have them."""
+        if (cell.qdisc, cell.buffer_bdp) != (self.queue or (None, None)):
+            configure_queue(self.paths, cell.links, cell.qdisc, cell.buffer_bdp)
+            self.queue = (cell.qdisc, cell.buffer_bdp)
+
+    def release(self):
+        """Called after every run: tears the topology down unless it is reused."""
+        if not self.args.reuse_topology:
+            self.close()
+
+    def restart_servers(self):
+        """Drop the iperf3 servers after a failed run so the next attempt starts fresh ones."""
+        if self.net is not None:
+            for h1, h2 in self.paths:
+                stop_iperf_servers(h2)
+
+    def close(self):
+        if self.net is not None:
+            cleanup(self.net)
+            self.net = self.paths = None
+
+def run_with_retries(testbed, cells, test_id, args, timeseries=None, ceiling=None):
+    """Run `test_id` of the cells, retrying the ones that failed up to --retries times.
+
+    A topology that cannot be prepared counts as a failed attempt.
+    Returns the metrics row of every cell that succeeded, by TCP version
+    (the list of the rows of its flows for a competition cell). `ceiling`
+    is the achievable bandwidth of their paths, if calibrated.
+    """
+    succeeded = {}
+    pending = list(cells)
+    for attempt in range(args.retries + 1):
+        if attempt:
+            print(f"Retrying test {test_id} for TCP {', '.join(cell.tcp_version for cell in pending)} "
+                  f"(attempt {attempt + 1} of {args.retries + 1})")
+        try:
+            paths = testbed.prepare(pending[0])
+        except RuntimeError as e:
+            # Failed health check or queue configuration: the next attempt starts from a new topology
+            print(f"Error: {e}")
+            testbed.close()
+            continue
+        try:
+            # Measure metrics
+            if pending[0].competitors:
+                # The flows of a competition run succeed or fail together
+                flows = measure_competition(paths, pending[0], test_id, args, timeseries, ceiling)
+                succeeded.update({pending[0].tcp_version: flows} if flows else {})
+            elif args.pairs > 1:
+                metrics = measure_metrics_concurrent(paths, pending, test_id, args, timeseries, ceiling)
+                succeeded.update((row['TCP Version'], row) for row in metrics)
+            else:
+                h1, h2 = paths[0]
+                metrics = measure_metrics(h1, h2, pending[0], test_id, args, timeseries, ceiling)
+                succeeded.update((row['TCP Version'], row) for row in metrics)
+        finally:
+            testbed.release()
+        pending = [cell for cell in pending if cell.tcp_version not in succeeded]
+        if not pending:
+            break
+        testbed.restart_servers()
+    return succeeded
+
+def run_batch(testbed, batch, journal, store, args, timeseries=None, ceiling=None):
+    """Run the repetitions of a batch of cells, skipping the runs the journal already has.
+
+    The rows of the runs are added to the results store, which is flushed
+    at the end of the batch, and their interval series to `timeseries`.
+    Competition cells always run their number of repetitions. `ceiling`
+    is the achievable bandwidth of the batch's paths, if calibrated.
+    """
+    # Run each cell its number of repetitions, or between min and max runs in adaptive mode
+    adaptive = args.adaptive and not batch[0].competitors
+    max_runs = args.max_runs if adaptive else batch[0].repetitions
+    samples = {cell.tcp_version: journal.completed_runs(cell) for cell in batch}
+    for cell in batch:
+        # Runs journaled before a crash may not have reached the store
+        for run_id, row in samples[cell.tcp_version].items():
+            store.add(cell, run_id, row)
+    failures = {cell.tcp_version: 0 for cell in batch}
+
+    active = []
+    for cell in batch:
+        if journal.is_quarantined(cell):
+            print(f"Skipping quarantined cell {cell.tcp_version}/{cell.ip_version}")
+        elif adaptive and journal.is_finished(cell):
+            print(f"Skipping finished cell {cell.tcp_version}/{cell.ip_version}")
+        else:
+            active.append(cell)
+
+    for test_id in range(1, max_runs + 1):
+        if not active:
+            break
+        pending = [cell for cell in active if test_id not in samples[cell.tcp_version]]
+        if pending:
+            print(f"Starting test {test_id} for TCP {', '.join(cell.tcp_version for cell in pending)} "
+                  f"and {batch[0].ip_version}")
+            succeeded = run_with_retries(testbed, pending, test_id, args, timeseries, ceiling)
+            for cell in pending:
+                row = succeeded.get(cell.tcp_version)
+                if row is not None:
+                    samples[cell.tcp_version][test_id] = row
+                    failures[cell.tcp_version] = 0
+                    journal.record_run(cell, test_id, row)
+                    store.add(cell, test_id, row)
+                    continue
+                failures[cell.tcp_version] += 1
+                journal.record_failure(cell, test_id, f"failed after {args.retries + 1} attempts")
+                if failures[cell.tcp_version] >= args.quarantine_after:
+                    # Keep the rest of the campaign moving instead of insisting on a broken cell
+                    print(f"Quarantining cell {cell.tcp_version}/{cell.ip_version} after "
+                          f"{failures[cell.tcp_version]} failed runs in a row")
+                    journal.quarantine(cell, f"{failures[cell.tcp_version]} failed runs in a row")
+                    active.remove(cell)
+
+        if adaptive:
+            # Stop the cells whose confidence intervals are already narrow enough
+            for done in [cell for cell in active if len(samples[cell.tcp_version]) >= args.min_runs
+                         and cell_converged(list(samples[cell.tcp_version].values()), args.ci_target, args.confidence)]:
+                finish_adaptive_cell(done, samples[done.tcp_version], test_id, True, journal, args)
+                active.remove(done)
+
+    if adaptive:
+        for cell in active:
+            finish_adaptive_cell(cell, samples[cell.tcp_version], max_runs, False, journal, args)
+    store.flush()
+
+def finish_adaptive_cell(cell, samples, runs, converged, journal, args):
+    """Record the stopping decision of an adaptive cell."""
+    for output_dir in cell.output_dirs:
+        save_adaptive_summary(output_dir, cell.tcp_version, cell.ip_version, list(samples.values()), runs,
+                              converged, args.confidence, cell.streams)
+    journal.finish(cell, converged)
+
+def run_campaign(cells, args):
+    """Run the cells, grouped by topology so that cells with the same links share its setup.
+
+    Completed runs are recorded in the journal of each scenario directory,
+    so running the same campaign again resumes it where it stopped, and
+    stored in the --results database. Their interval series go to the
+    --timeseries directory. With --calibration, the achievable bandwidth
+    of every topology is calibrated (or read from the cache) first.
+    """
+    journal = CampaignJournal()
+    store = ResultsStore(args.results)
+    timeseries = TimeSeriesStore(args.timeseries) if args.timeseries else None
+    calibration = None
+    if args.calibration:
+        calibration = Calibration(args.calibration, args, args.calibration_streams, args.calibration_duration,
+                                  args.recalibrate)
+        calibration.calibrate(cells)
+
+    try:
+        for group in group_by_topology(cells):
+            testbed = Testbed(group[0].links, args, senders(group[0]))
+            try:
+                for batch in batch_cells(group, args.pairs):
+                    ceiling = calibration.ceiling(batch[0]) if calibration else None
+                    run_batch(testbed, batch, journal, store, args, timeseries, ceiling)
+            finally:
+                testbed.close()
+    finally:
+        store.close()
+    print(f"Results saved to {args.results}")
@@ -0,0 +1,388 @@
+"""Scenario specifications and the job matrix built from them.
+
+A scenario is a JSON file (usually `<scenario dir>/scenario.json`) such as:
+
+    {
+        "name": "scenario-II",
+        "links": {
+            "access": {"bw": 100000, "loss": 0, "delay": "0ms"},
+            "bottleneck": {"bw": 100000, "loss": 1, "delay": "10ms"}
+        },
+        "max_bandwidth_gbps": 100,
+        "duration": 30,
+        "repetitions": 30,
+        "tcp_versions": ["reno", "cubic", "bbr", "vegas", "veno", "westwood"],
+        "ip_versions": ["IPv4", "IPv6"],
+        "streams": [1, 8]
+    }
+
+The link parameters are passed as they are to Mininet's TCLink. Missing
+keys take the values of DEFAULT_SCENARIO. "streams" lists the numbers of
+parallel TCP streams of each test (iperf3 -P). Results are written next
+to the specification file unless it sets "output_dir".
+
+A scenario with a "competition" section measures algorithms against
+each other instead of alone: several senders share the r1-r2 link, one
+flow per algorithm of a pairing, started `stagger` seconds apart so that
+they all end together:
+
+    "competition": {"flows": 2, "stagger": 5, "pairings": [["bbr", "cubic"]]}
+
+Without "pairings", every combination of `flows` of its TCP versions
+(an algorithm against itself included) is measured.
+
+A "sweep" section measures a grid of operating points of the bottleneck
+link, in the units of TCLink (bw in Mbit/s, loss in %):
+
+    "sweep": {"bw": [10, 100, 500, 1000], "delay": ["0ms", "10ms", "50ms", "100ms"],
+              "loss": [0, 0.1, 1]}
+
+Each point overrides those parameters of "links"/"bottleneck", and its
+bandwidth becomes the maximum bandwidth of the point. TCLink only shapes
+up to BW_PARAM_MAX Mbit/s (it ignores larger rates), so swept bandwidths
+must be within it. Only the parameters
+of SWEEP_PARAMETERS can be swept: a reused topology is moved from one
+point to the next by reconfiguring the link in place.
+
+A "link_trace" replays a schedule of link conditions on the bottleneck
+during each test. It names a CSV file (relative to the specification)
+with a `time` column, in seconds from the start of the iperf3 test (its
+--json-stream "start" event), and any of `bw` (Mbit/s), `delay` (ms) and `loss` (%); empty fields keep
+the previous value:
+
+    time,bw,delay,loss
+    0,1000,10,0
+    10,,80,
+    12,100,10,1
+
+The conditions are applied on top of the bottleneck of "links", which
+must shape the bandwidth ("bw", at most BW_PARAM_MAX Mbit/s) if the
+trace changes it and emulate delay or loss (netem) if the trace changes
+those, at every point of the sweep.
+
+"loss_bursts" injects bursts of Gilbert-Elliott loss (netem's gemodel,
+with its p, r, 1-h and 1-k in %) at known times: `duration` seconds every
+`every` seconds from `start`. It is replayed as a link trace, so the two
+cannot be combined, and the runs report how long the flows took to
+recover from each burst. Between the bursts the loss returns to that of
+the bottleneck, which therefore cannot be swept:
+
+    "loss_bursts": {"start": 5, "every": 10, "duration": 0.5, "gemodel": [5, 20, 80, 0.1]}
+
+"qdiscs" makes the queue discipline of the bottleneck an axis, and
+"buffers_bdp" its buffer size, as multiples of the bandwidth-delay
+product of the path (default [1]). The bottleneck must be shaped ("bw"
+of at most BW_PARAM_MAX Mbit/s):
+
+    "qdiscs": ["pfifo", "fq", "fq_codel", "pie", "red"], "buffers_bdp": [0.5, 1, 4]
+
+The queue is attached to r1's end of the bottleneck, after netem, so
+netem's own limit ("max_queue_size", 1000 packets by default) must hold
+the packets in flight on the delay. Without "qdiscs" the bottleneck keeps
+TCLink's queueing.
+
+Scenarios are expanded into cells, one per (operating point, TCP version
+or pairing, IP version, number of streams) of each scenario. Cells are
+the unit the runner schedules: they can be reordered and sharded,
+identical cells of different scenarios are measured once, and cells with
+the same topology share its setup.
+"""
+from collections import namedtuple
+import csv
+from itertools import combinations_with_replacement, product
+import json
+import os
+import random
+import re
+
+DEFAULT_SCENARIO = {
+    'links': {'access': {}, 'bottleneck': {}},
+    'max_bandwidth_gbps': 100,
+    'duration': 30,
+    'repetitions': 30,
+    'tcp_versions': ['reno', 'cubic', 'bbr', 'vegas', 'veno', 'westwood'],
+    'ip_versions': ['IPv4', 'IPv6'],
+    'streams': [1],
+}
+
+IP_VERSIONS = ('IPv4', 'IPv6')
+
+# Bottleneck parameters TCLink can change on a running link (netem and HTB)
+SWEEP_PARAMETERS = ('bw', 'delay', 'jitter', 'loss', 'max_queue_size')
+
+# Largest bw TCLink shapes (TCIntf.bwParamMax): it leaves links with a larger bw unshaped
+BW_PARAM_MAX = 1000
+
+# Queue disciplines of the "qdiscs" axis
+QDISCS = ('pfifo', 'fq', 'fq_codel', 'pie', 'red')
+
+# Parameters of a link trace: bandwidth (Mbit/s), delay (ms) and loss (%)
+TRACE_PARAMETERS = ('bw', 'delay', 'loss')
+
+DELAY_UNITS = {'s': 1e3, 'ms': 1, 'us': 1e-3}
+
+# A schedule of link conditions: `steps` holds (time, bw, delay, loss)
+# tuples, None for the values a step keeps; a loss can also be a netem
+# loss model ("gemodel 5% 20% 80% 0.1%")
+LinkTrace = namedtuple('LinkTrace', ['name', 'steps'])
+
+# One (TCP version, IP version, streams) combination of a scenario, repeated
+# `repetitions` times. `output_dirs` lists every scenario directory that
+# receives its results (several when identical cells were merged).
+# `link_trace` is the LinkTrace replayed during its runs, if any, and
+# `qdisc` the queue discipline of the bottleneck with a buffer of
+# `buffer_bdp` times the bandwidth-delay product (None for TCLink's). In
+# competition cells, `competitors` lists the algorithm of each flow,
+# `tcp_version` names the pairing ("bbr+cubic") and the flows start
+# `stagger` seconds apart.
+Cell = namedtuple('Cell', ['links', 'duration', 'repetitions', 'max_bandwidth',
+                           'tcp_version', 'ip_version', 'output_dirs', 'streams', 'competitors', 'stagger',
+                           'link_trace', 'qdisc', 'buffer_bdp'],
+                  defaults=(1, (), 0, None, None, None))
+
+def load_scenario(path):
+    """Load a scenario specification from a JSON file or a directory holding scenario.json."""
+    if os.path.isdir(path):
+        path = os.path.join(path, "scenario.json")
+    with open(path) as f:
+        spec = json.load(f)
+
+    scenario = dict(DEFAULT_SCENARIO, **spec)
+    scenario['links'] = dict(DEFAULT_SCENARIO['links'], **spec.get('links', {}))
+    scenario.setdefault('name', os.path.basename(os.path.dirname(os.path.abspath(path))))
+    scenario.setdefault('output_dir', os.path.dirname(os.path.abspath(path)))
+
+    unknown = set(scenario['links']) - set(DEFAULT_SCENARIO['links'])
+    if unknown:
+        raise ValueError(f"{path}: unknown links {sorted(unknown)}")
+    invalid = set(scenario['ip_versions']) - set(IP_VERSIONS)
+    if invalid:
+        raise ValueError(f"{path}: invalid IP versions {sorted(invalid)}")
+    if scenario['duration'] <= 0 or scenario['repetitions'] <= 0:
+        raise ValueError(f"{path}: duration and repetitions must be positive")
+    if not scenario['streams'] or any(not isinstance(streams, int) or streams < 1 for streams in scenario['streams']):
+        raise ValueError(f"{path}: streams must be a list of positive integers")
+    if 'competition' in scenario:
+        competition = dict({'flows': 2, 'stagger': 0}, **scenario['competition'])
+        competition.setdefault('pairings', [list(pairing) for pairing in
+                                            combinations_with_replacement(scenario['tcp_versions'],
+                                                                          competition['flows'])])
+        if any(len(pairing) < 2 for pairing in competition['pairings']):
+            raise ValueError(f"{path}: competition pairings need at least 2 flows")
+        if any(scenario['duration'] <= (len(pairing) - 1) * competition['stagger']
+               for pairing in competition['pairings']):
+            raise ValueError(f"{path}: the last competing flow would start after the end of the test")
+        scenario['competition'] = competition
+    if 'sweep' in scenario:
+        unknown = set(scenario['sweep']) - set(SWEEP_PARAMETERS)
+        if unknown:
+            raise ValueError(f"{path}: parameters {sorted(unknown)} cannot be swept")
+        if any(not isinstance(values, list) or not values for values in scenario['sweep'].values()):
+            raise ValueError(f"{path}: sweep values must be non-empty lists")
+        if any(not isinstance(bw, (int, float)) or not 0 < bw <= BW_PARAM_MAX
+               for bw in scenario['sweep'].get('bw', [])):
+            raise ValueError(f"{path}: swept bw must be between 0 and {BW_PARAM_MAX} Mbit/s, "
+                             f"TCLink does not shape larger rates")
+    if 'loss_bursts' in scenario:
+        if 'link_trace' in scenario:
+            raise ValueError(f"{path}: loss_bursts and link_trace cannot be combined")
+        if 'loss' in scenario.get('sweep', {}):
+            # Between the bursts the trace returns to one loss rate, the same for every point
+            raise ValueError(f"{path}: loss_bursts and a sweep of loss cannot be combined")
+        scenario['link_trace'] = loss_bursts(scenario['loss_bursts'], scenario['duration'],
+                                             scenario['links']['bottleneck'].get('loss') or 0, path)
+    if 'link_trace' in scenario:
+        if isinstance(scenario['link_trace'], LinkTrace):
+            trace = scenario['link_trace']
+        else:
+            trace = load_link_trace(os.path.join(os.path.dirname(os.path.abspath(path)), scenario['link_trace']))
+        # The trace changes the qdiscs TCLink built, at every operating point
+        bottlenecks = [links['bottleneck'] for links, max_bandwidth in operating_points(scenario)]
+        if any(step[1] is not None for step in trace.steps) and not all(map(has_htb, bottlenecks)):
+            raise ValueError(f"{path}: the link trace changes bw, the bottleneck needs a 'bw' of at most "
+                             f"{BW_PARAM_MAX} Mbit/s")
+        if any(step[2] is not None or step[3] is not None for step in trace.steps) and \
+                not all(map(has_netem, bottlenecks)):
+            raise ValueError(f"{path}: the link trace changes delay or loss, the bottleneck needs a 'delay'")
+        scenario['link_trace'] = trace
+    if 'qdiscs' in scenario:
+        invalid = set(scenario['qdiscs']) - set(QDISCS)
+        if invalid or not scenario['qdiscs']:
+            raise ValueError(f"{path}: qdiscs must be a list of {', '.join(QDISCS)}, not {sorted(invalid)}")
+        scenario.setdefault('buffers_bdp', [1])
+        if not scenario['buffers_bdp'] or any(not isinstance(buffer, (int, float)) or buffer <= 0
+                                              for buffer in scenario['buffers_bdp']):
+            raise ValueError(f"{path}: buffers_bdp must be a list of positive numbers")
+        if not all(has_htb(links['bottleneck']) for links, max_bandwidth in operating_points(scenario)):
+            # Without the rate limit no standing queue builds up, and the BDP has no bandwidth
+            raise ValueError(f"{path}: qdiscs need a bottleneck shaped by TCLink, with a 'bw' of at most "
+                             f"{BW_PARAM_MAX} Mbit/s")
+    return scenario
+
+def load_link_trace(path):
+    """Load a link trace from a CSV file of (time, bw, delay, loss) rows."""
+    steps = []
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        unknown = set(reader.fieldnames or []) - {'time', *TRACE_PARAMETERS}
+        if 'time' not in (reader.fieldnames or []) or unknown:
+            raise ValueError(f"{path}: a link trace has a time column and any of {', '.join(TRACE_PARAMETERS)}")
+        for row in reader:
+            try:
+                steps.append((float(row['time']), *(float(row[name]) if row.get(name, '').strip() else None
+                                                    for name in TRACE_PARAMETERS)))
+            except ValueError:
+                raise ValueError(f"{path}:{reader.line_num}: invalid link trace row {row}") from None
+    if not steps or any(b[0] < a[0] for a, b in zip(steps, steps[1:])) or steps[0][0] < 0:
+        raise ValueError(f"{path}: link trace times must be non-negative and in order")
+    return LinkTrace(os.path.splitext(os.path.basename(path))[0], tuple(steps))
+
+def loss_bursts(spec, duration, loss, path):
+    """The link trace of a "loss_bursts" specification, returning to `loss` between the bursts."""
+    bursts = dict({'start': 0, 'every': duration, 'duration': 1}, **spec)
+    gemodel = bursts.get('gemodel')
+    if not isinstance(gemodel, list) or not 1 <= len(gemodel) <= 4 or \
+            any(not isinstance(value, (int, float)) or not 0 <= value <= 100 for value in gemodel):
+        raise ValueError(f"{path}: gemodel must list 1 to 4 percentages (p, r, 1-h, 1-k)")
+    if bursts['start'] < 0 or not 0 < bursts['duration'] < bursts['every']:
+        raise ValueError(f"{path}: loss bursts must be shorter than the time between them")
+    model = "gemodel " + " ".join(f"{value:g}%" for value in gemodel)
+    steps = []
+    time = bursts['start']
+    while time < duration:
+        steps += [(time, None, None, model), (time + bursts['duration'], None, None, loss)]
+        time += bursts['every']
+    name = (f"gebursts{bursts['start']:g}+{bursts['every']:g}x{bursts['duration']:g}-"
+            + "-".join(f"{value:g}" for value in gemodel))
+    return LinkTrace(name, tuple(steps))
+
+def delay_ms(delay):
+    """A TCLink delay ('10ms', '100us', ...) in ms; without a unit tc reads microseconds."""
+    if delay is None:
+        return None
+    match = re.fullmatch(r'\s*([\d.]+)\s*(s|ms|us)?\s*', str(delay))
+    if not match:
+        return None
+    return float(match.group(1)) * DELAY_UNITS[match.group(2) or 'us']
+
+def has_htb(params):
+    """Whether TCLink shapes a link with the parameters `params` with HTB (see TCIntf.bwCmds())."""
+    bw = params.get('bw')
+    return bw is not None and not (bw and (bw < 0 or bw > BW_PARAM_MAX))
+
+def has_netem(params):
+    """Whether TCLink gives a link with the parameters `params` a netem qdisc (see TCIntf.delayCmds())."""
+    return (params.get('delay') is not None or params.get('jitter') is not None
+            or (params.get('loss') or 0) > 0 or params.get('max_queue_size') is not None)
+
+def topology_key(links):
+    """Hashable identity of the links of a cell."""
+    return json.dumps(links, sort_keys=True)
+
+def setup_key(links):
+    """Hashable identity of a topology: cells with the same key can share one setup.
+
+    Cells that differ by the SWEEP_PARAMETERS of the bottleneck alone can,
+    since the link is reconfigured in place between them.
+    """
+    bottleneck = {name: value for name, value in links['bottleneck'].items() if name not in SWEEP_PARAMETERS}
+    return topology_key(dict(links, bottleneck=bottleneck))
+
+def operating_points(scenario):
+    """(links, maximum bandwidth in bit/s) of each point of a scenario's sweep, or of the scenario itself."""
+    sweep = scenario.get('sweep', {})
+    points = []
+    for values in product(*sweep.values()):
+        bottleneck = dict(scenario['links']['bottleneck'], **dict(zip(sweep, values)))
+        links = dict(scenario['links'], bottleneck=bottleneck)
+        max_bandwidth = bottleneck['bw'] * 1e6 if 'bw' in sweep else scenario['max_bandwidth_gbps'] * 1e9
+        points.append((links, max_bandwidth))
+    return points
+
+def queues(scenario):
+    """(queue discipline, buffer in BDP) of the cells of a scenario, (None, None) without "qdiscs"."""
+    if 'qdiscs' not in scenario:
+        return [(None, None)]
+    return list(product(scenario['qdiscs'], scenario['buffers_bdp']))
+
+def expand_matrix(scenarios):
+    """Expand scenarios into their cells, in the order of the specification files.
+
+    Within a scenario cells are ordered by operating point, queue, number
+    of streams, TCP version (or pairing), then IP version, as the original
+    per-scenario scripts ran them.
+    """
+    return [Cell(links, scenario['duration'], scenario['repetitions'],
+                 max_bandwidth, tcp_version, ip_version, (scenario['output_dir'],), streams,
+                 competitors, scenario['competition']['stagger'] if competitors else 0, scenario.get('link_trace'),
+                 qdisc, buffer_bdp)
+            for scenario in scenarios
+            for links, max_bandwidth in operating_points(scenario)
+            for qdisc, buffer_bdp in queues(scenario)
+            for streams in scenario['streams']
+            for tcp_version, competitors in algorithms(scenario)
+            for ip_version in scenario['ip_versions']]
+
+def algorithms(scenario):
+    """(TCP version, competitors) of the cells of a scenario: its pairings in competition mode."""
+    if 'competition' in scenario:
+        return [("+".join(pairing), tuple(pairing)) for pairing in scenario['competition']['pairings']]
+    return [(tcp_version, ()) for tcp_version in scenario['tcp_versions']]
+
+def deduplicate(cells):
+    """Merge identical cells of different scenarios so they are measured once."""
+    merged = {}
+    for cell in cells:
+        key = (topology_key(cell.links), cell.duration, cell.repetitions, cell.max_bandwidth,
+               cell.tcp_version, cell.ip_version, cell.streams, cell.competitors, cell.stagger, cell.link_trace,
+               cell.qdisc, cell.buffer_bdp)
+        if key in merged:
+            previous = merged[key]
+            merged[key] = previous._replace(output_dirs=previous.output_dirs + cell.output_dirs)
+        else:
+            merged[key] = cell
+    return list(merged.values())
+
+def reorder(cells, order="spec", seed=None):
+    """Order the cells: as in the specifications ("spec") or randomly ("shuffle").
+
+    Shuffling spreads slow drifts of the machine (thermal, background load)
+    over all algorithms instead of biasing the ones measured last.
+    """
+    if order == "spec":
+        return list(cells)
+    if order == "shuffle":
+        cells = list(cells)
+        random.Random(seed).shuffle(cells)
+        return cells
+    raise ValueError(f"unknown order {order!r}")
+
+def shard(cells, index, count):
+    """Keep the cells of shard `index` (1-based) out of `count`."""
+    return [cell for position, cell in enumerate(cells) if position % count == index - 1]
+
+def senders(cell):
+    """Number of senders sharing the bottleneck of the cell's topology."""
+    return max(1, len(cell.competitors))
+
+def group_by_topology(cells):
+    """Group the cells by topology (see setup_key()) and senders, keeping the order of first appearance."""
+    groups = {}
+    for cell in cells:
+        groups.setdefault((setup_key(cell.links), senders(cell)), []).append(cell)
+    return list(groups.values())
+
+def batch_cells(cells, pairs):
+    """Split the cells of a topology into batches measured at the same time on `pairs` paths.
+
+    Only cells that differ by TCP version alone can share a batch, and
+    competition cells, which use all the senders, run alone.
+    """
+    if pairs <= 1 or cells[0].competitors:
+        return [[cell] for cell in cells]
+    buckets = {}
+    for cell in cells:
+        key = (topology_key(cell.links), cell.duration, cell.repetitions, cell.max_bandwidth, cell.ip_version,
+               cell.output_dirs, cell.streams, cell.link_trace, cell.qdisc, cell.buffer_bdp)
+        buckets.setdefault(key, []).append(cell)
+    return [bucket[i:i + pairs] for bucket in buckets.values() for i in range(0, len(bucket), pairs)]
@@ -0,0 +1,129 @@
+"""Sampling of the kernel TCP state of the test sockets with `ss -tin`."""
+import re
+import signal
+import subprocess
+import threading
+from time import time
+
+import psutil
+
+from .stats import RunningStats
+from .timeseries import SampleSeries
+
+RATE_UNITS = {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9}
+
+def parse_rate(value, unit):
+    return float(value) * RATE_UNITS[unit]
+
+def parse_tcp_info(text):
+    """TCP state of a socket from its `ss -i` line: cwnd, rtt, pacing rate, BBR model..."""
+    info = {}
+    for name, value in re.findall(r'\b(cwnd|ssthresh|unacked|bytes_acked|mss):(\d+)', text):
+        info[name] = int(value)
+    match = re.search(r'\brtt:([\d.]+)/([\d.]+)', text)
+    if match:
+        info['rtt'], info['rttvar'] = float(match.group(1)), float(match.group(2))
+    for name, value, unit in re.findall(r'\b(pacing_rate|delivery_rate) ([\d.]+)([KMG]?)bps', text):
+        info[name] = parse_rate(value, unit)
+    match = re.search(r'\bretrans:\d+/(\d+)', text)
+    if match:
+        info['retrans'] = int(match.group(1))
+    match = re.search(r'\bbbr:\(([^)]*)\)', text)
+    if match:
+        for name, value in re.findall(r'(\w+):([^,]+)', match.group(1)):
+            rate = re.fullmatch(r'([\d.]+)([KMG]?)bps', value)
+            if rate:
+                info[f'bbr_{name}'] = parse_rate(*rate.groups())
+            elif re.fullmatch(r'[\d.]+', value):
+                info[name if name.endswith('_gain') else f'bbr_{name}'] = float(value)
+    if 'unacked' in info and 'mss' in info:
+        info['bytes_in_flight'] = info['unacked'] * info['mss']
+    return info
+
+class SocketSampler:
+    """Polls `ss -tin` for the sockets to `port` in h1's namespace every `interval` seconds.
+
+    A shell loop runs ss inside the namespace and the output is parsed by
+    a reader thread into a SampleSeries of kind "tcp_info", one source per
+    (local port, field), e.g. "45678 cwnd". Each fork of ss costs some CPU
+    on the machine under test: the CPU time the sampler used and the
+    interval it actually achieved are reported by summary() so that runs
+    where sampling competed with the test can be spotted.
+    """
+
+    def __init__(self, h1, port, interval=0.02):
+        self.h1 = h1
+        self.port = port
+        self.interval = interval
+        self.series = SampleSeries('tcp_info')
+        self.samples = 0
+        self.last = {}
+        self.process = None
+        self.cpu_seconds = None
+        self.start_time = None
+        self.elapsed = 0
+        self.thread = threading.Thread(target=self._read, name="ss-sampler", daemon=True)
+
+    def start(self):
+        loop = f"while :; do date +@%s.%N; ss -Htin dport = :{self.port}; sleep {self.interval}; done"
+        self.start_time = time()
+        self.process = self.h1.popen(["sh", "-c", loop], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and measure the CPU time the sampler used."""
+        try:
+            times = psutil.Process(self.process.pid).cpu_times()
+            self.cpu_seconds = times.user + times.system + times.children_user + times.children_system
+        except psutil.Error:
+            self.cpu_seconds = None
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait()
+        self.thread.join()
+        self.elapsed = time() - self.start_time
+
+    def _read(self):
+        timestamp, sport = None, None
+        for line in self.process.stdout:
+            line = line.decode()
+            if line.startswith("@"):
+                timestamp = float(line[1:]) - self.start_time
+                self.samples += 1
+            elif not line[:1].isspace():
+                # Socket line: State Recv-Q Send-Q Local:Port Peer:Port
+                fields = line.split()
+                sport = fields[3].rsplit(":", 1)[-1] if len(fields) > 3 else None
+            elif timestamp is not None and sport is not None:
+                info = parse_tcp_info(line)
+                for name, value in info.items():
+                    self.series.add(timestamp, f"{sport} {name}", value)
+                self.last[sport] = info
+
+    def data_socket(self):
+        """Local port of the test's data socket: the one that moved the most bytes (not the control one)."""
+        if not self.last:
+            return None
+        return max(self.last, key=lambda sport: self.last[sport].get('bytes_acked', 0))
+
+    def field_stats(self, field, sport):
+        stats = RunningStats()
+        source = self.series.sources.get(f"{sport} {field}")
+        if source is not None:
+            for index, value in zip(self.series.columns['source'], self.series.columns['value']):
+                if index == source:
+                    stats.add(value)
+        return stats
+
+    def summary(self):
+        """Summary metrics of the test and the overhead of sampling it."""
+        sport = self.data_socket()
+        pacing, delivery = self.field_stats('pacing_rate', sport), self.field_stats('delivery_rate', sport)
+        return {
+            'ss Samples': self.samples,
+            'ss Sample Interval (ms)': round(self.elapsed / self.samples * 1000, 2) if self.samples else '',
+            'ss Sampler CPU (%)': (round(self.cpu_seconds / self.elapsed * 100, 2)
+                                   if self.cpu_seconds is not None and self.elapsed else ''),
+            'Mean Pacing Rate (Gbps)': round(pacing.mean / 1e9, 2) if pacing.count else '',
+            'Mean Delivery Rate (Gbps)': round(delivery.mean / 1e9, 2) if delivery.count else '',
+        }
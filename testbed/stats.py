@@ -0,0 +1,136 @@
+"""Single-pass statistics over streams of samples.
+
+RunningStats summarises a stream of values (count, mean, variance, min,
+max and percentiles) in one pass with bounded memory, so long runs with
+fine-grained interval reports stay cheap to summarise. Summaries are
+mergeable: the statistics of several streams can be computed separately
+and then aggregated exactly (moments) or within the sketch accuracy
+(percentiles).
+"""
+import math
+
+# Percentiles reported by RunningStats.to_dict()
+PERCENTILES = (50, 90, 99, 99.9)
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (logarithmic buckets, as in DDSketch).
+
+    A value v > 0 is counted in bucket ceil(log(v) / log(gamma)), so any
+    quantile is returned within `relative_accuracy` of the true value. The
+    buckets cover about 1400 orders of gamma for 1% accuracy, and past
+    `max_buckets` the lowest ones are collapsed, which only costs accuracy
+    on the lowest quantiles. Values <= 0 are counted as zeros.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        self.count += count
+        if value <= 0:
+            self.zeros += count
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def merge(self, other):
+        """Add the values counted by `other`, a sketch with the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches of different accuracy")
+        self.count += other.count
+        self.zeros += other.zeros
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q):
+        """Value at quantile `q` (0 to 1), or None when the sketch is empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0
+        seen = self.zeros
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Middle of the bucket (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+class RunningStats:
+    """Count, mean, variance, min, max and percentiles of a stream of values.
+
+    Moments use Welford's algorithm and percentiles a QuantileSketch, so
+    memory stays bounded however many values are added.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        """Aggregate the values summarised by `other` (Chan et al.'s parallel update)."""
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance (the 'RTT Variance (ms)' of the metrics)."""
+        return self.m2 / self.count if self.count else 0
+
+    def percentile(self, p):
+        """Value at percentile `p` (0 to 100), exact at the extremes; None when empty."""
+        value = self.sketch.quantile(p / 100)
+        return None if value is None else min(max(value, self.min), self.max)
+
+    def to_dict(self):
+        if not self.count:
+            return {'count': 0}
+        summary = {'count': self.count, 'mean': self.mean, 'variance': self.variance,
+                   'min': self.min, 'max': self.max}
+        for p in PERCENTILES:
+            summary[f'p{p:g}'] = self.percentile(p)
+        return summary
+
+def merged(stats):
+    """A RunningStats aggregating all the given ones."""
+    total = RunningStats()
+    for item in stats:
+        total.merge(item)
+    return total
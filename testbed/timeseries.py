@@ -0,0 +1,206 @@
+"""Time series of the runs, stored as memory-mappable columns.
+
+A campaign's series live in one directory with a subdirectory per kind
+of series, each holding a raw binary file per column (native byte order,
+fixed dtype) and an index:
+
+    timeseries/intervals/  time.f8 stream.i4 bits_per_second.f8 rtt.f8 rttvar.f8 snd_cwnd.i8 retransmits.i4 bytes.i8
+    timeseries/tcp_probe/  time.f8 sport.i4 snd_cwnd.i8 ssthresh.i8 srtt.i8 snd_wnd.i8 in_flight.i8
+    timeseries/cpu/        time.f8 source.i4 value.f8
+    timeseries/<kind>/index.jsonl
+
+"intervals" holds the iperf3 interval reports, one row per stream per
+interval, and "tcp_probe" the tcp:tcp_probe events, one row per ACK.
+The other kinds hold samples in long format: `source` indexes the
+"sources" list of the run's index entry (e.g. "cpu0", "iperf3 client").
+The rows of a run are contiguous; its line in index.jsonl gives where
+they are:
+
+    {"cell": ..., "scenarios": [...], "tcp_version": "bbr", "ip_version": "IPv4",
+     "run_id": 3, "offset": 120000, "rows": 600, "streams": 1}
+
+so a run is a slice of every column, e.g. with NumPy:
+
+    cwnd = numpy.memmap("timeseries/intervals/snd_cwnd.i8", dtype="i8", mode="r")[offset:offset + rows]
+
+or without it, with load_column(). The flows of a competition run have
+an entry each, with their "flow" number. A run measured again after a
+crash gets a new entry: the last entry of a (cell, run_id, flow) is the
+valid one.
+"""
+from array import array
+import fcntl
+import json
+import mmap
+import os
+
+from .journal import cell_id
+
+# (column, array typecode, file suffix) of each kind of series
+INTERVAL_COLUMNS = [
+    ('time', 'd', 'f8'),
+    ('stream', 'i', 'i4'),
+    ('bits_per_second', 'd', 'f8'),
+    ('rtt', 'd', 'f8'),
+    ('rttvar', 'd', 'f8'),
+    ('snd_cwnd', 'q', 'i8'),
+    ('retransmits', 'i', 'i4'),
+    ('bytes', 'q', 'i8'),
+]
+PROBE_COLUMNS = [
+    ('time', 'd', 'f8'),
+    ('sport', 'i', 'i4'),
+    ('snd_cwnd', 'q', 'i8'),
+    ('ssthresh', 'q', 'i8'),
+    ('srtt', 'q', 'i8'),
+    ('snd_wnd', 'q', 'i8'),
+    ('in_flight', 'q', 'i8'),
+]
+SAMPLE_COLUMNS = [
+    ('time', 'd', 'f8'),
+    ('source', 'i', 'i4'),
+    ('value', 'd', 'f8'),
+]
+
+SCHEMAS = {'intervals': INTERVAL_COLUMNS, 'tcp_probe': PROBE_COLUMNS}
+
+def schema(kind):
+    """Columns of a kind of series."""
+    return SCHEMAS.get(kind, SAMPLE_COLUMNS)
+
+class IntervalSeries:
+    """The interval reports of one run, in compact typed columns."""
+
+    kind = 'intervals'
+
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode, suffix in INTERVAL_COLUMNS}
+        self.sockets = {}
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def metadata(self):
+        return {'streams': len(self.sockets)}
+
+    def add(self, interval):
+        """Append the rows of one iperf3 interval report, one per stream."""
+        for stream in interval['streams']:
+            self.columns['time'].append(stream['end'])
+            self.columns['stream'].append(self.sockets.setdefault(stream['socket'], len(self.sockets)))
+            self.columns['bits_per_second'].append(stream['bits_per_second'])
+            self.columns['rtt'].append(stream.get('rtt', 0))
+            self.columns['rttvar'].append(stream.get('rttvar', 0))
+            self.columns['snd_cwnd'].append(int(stream.get('snd_cwnd', 0)))
+            self.columns['retransmits'].append(int(stream.get('retransmits', 0)))
+            self.columns['bytes'].append(int(stream['bytes']))
+
+class ProbeSeries:
+    """The tcp:tcp_probe events of one run, in compact typed columns."""
+
+    kind = 'tcp_probe'
+
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode, suffix in PROBE_COLUMNS}
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def metadata(self):
+        return {}
+
+    def add(self, *values):
+        """Append one event: the values of PROBE_COLUMNS, in order."""
+        for (name, typecode, suffix), value in zip(PROBE_COLUMNS, values):
+            self.columns[name].append(value)
+
+class SampleSeries:
+    """Samples of named sources during one run (CPU usage, ...), in long format."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.columns = {name: array(typecode) for name, typecode, suffix in SAMPLE_COLUMNS}
+        self.sources = {}
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def metadata(self):
+        return {'sources': list(self.sources)}
+
+    def add(self, time, source, value):
+        self.columns['time'].append(time)
+        self.columns['source'].append(self.sources.setdefault(source, len(self.sources)))
+        self.columns['value'].append(value)
+
+class TimeSeriesStore:
+    """Appends the series of the runs of a campaign to a time-series directory.
+
+    Several campaigns (run_parallel.py) can append to the same directory:
+    appends are serialised with a lock on the index of each kind.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def append(self, cell, run_id, series, flow=None):
+        """Store the series of run `run_id` of `cell` (of one of its flows in competition)."""
+        if not len(series):
+            return
+        directory = os.path.join(self.directory, series.kind)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "index.jsonl"), 'a+') as index:
+            fcntl.flock(index, fcntl.LOCK_EX)
+            try:
+                offset = self._truncate_to_index(series.kind, index)
+                for name, typecode, suffix in schema(series.kind):
+                    with open(column_path(self.directory, series.kind, name), 'ab') as f:
+                        series.columns[name].tofile(f)
+                # The index is written last: rows it does not cover are leftovers of a crash
+                entry = {'cell': cell_id(cell),
+                         'scenarios': [os.path.basename(output_dir) for output_dir in cell.output_dirs],
+                         'tcp_version': cell.tcp_version, 'ip_version': cell.ip_version,
+                         'run_id': run_id, 'offset': offset, 'rows': len(series), **series.metadata()}
+                if flow is not None:
+                    entry['flow'] = flow
+                index.write(json.dumps(entry) + "\n")
+                index.flush()
+            finally:
+                fcntl.flock(index, fcntl.LOCK_UN)
+
+    def _truncate_to_index(self, kind, index):
+        """Drop rows a crash left past the last indexed run; returns the number of rows kept."""
+        index.seek(0)
+        content = index.read()
+        if not content.endswith("\n"):
+            # Index line cut short: the next entry must start on a new line
+            index.truncate(content.rfind("\n") + 1)
+        entries = [json.loads(line) for line in content.splitlines(keepends=True) if line.endswith("\n")]
+        rows = max((entry['offset'] + entry['rows'] for entry in entries), default=0)
+        for name, typecode, suffix in schema(kind):
+            path = column_path(self.directory, kind, name)
+            if os.path.exists(path) and os.path.getsize(path) > rows * array(typecode).itemsize:
+                os.truncate(path, rows * array(typecode).itemsize)
+        return rows
+
+def column_path(directory, kind, name):
+    suffix = next(suffix for column, typecode, suffix in schema(kind) if column == name)
+    return os.path.join(directory, kind, f"{name}.{suffix}")
+
+def load_index(directory, kind='intervals'):
+    """Entries of the runs in a time-series directory, the latest one per (cell, run_id, flow)."""
+    entries = {}
+    with open(os.path.join(directory, kind, "index.jsonl")) as f:
+        for line in f:
+            if line.endswith("\n"):
+                entry = json.loads(line)
+                entries[(entry['cell'], entry['run_id'], entry.get('flow'))] = entry
+    return list(entries.values())
+
+def load_column(directory, name, kind='intervals'):
+    """Memory-map a column as a typed memoryview; slice it with the offsets of the index."""
+    typecode = next(typecode for column, typecode, suffix in schema(kind) if column == name)
+    with open(column_path(directory, kind, name), 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return memoryview(array(typecode))
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(typecode)
@@ -0,0 +1,257 @@
+"""Mininet topology of the tests: h1 -> r1 -> r2 -> h2 paths with IPv4 and IPv6."""
+import math
+import re
+from time import sleep, time
+
+from mininet.link import TCLink
+from mininet.net import Mininet
+
+from .iperf import stop_iperf_servers
+from .scenario import delay_ms, has_htb, has_netem
+
+MTU = 1500
+
+def enable_ip_forwarding(router):
+    """Ativa o encaminhamento de pacotes IPv4 e IPv6 em um roteador."""
+    router.cmd("sysctl -w net.ipv4.ip_forward=1")
+    router.cmd("sysctl -w net.ipv6.conf.all.forwarding=1")
+
+def path_suffix(index):
+    """Name suffix of the nodes of path `index` (the first path keeps the plain names)."""
+    return "" if index == 0 else f"p{index + 1}"
+
+def sender_suffix(sender):
+    """Name suffix of the hosts of sender `sender` of a path (the first sender keeps the plain names)."""
+    return "" if sender == 0 else f"s{sender + 1}"
+
+def create_topology(links, prefix="", pairs=1, senders=1):
+    """Create a Mininet topology with `pairs` isolated paths of `senders` sender/receiver pairs.
+
+    `links` holds the TCLink parameters (bw, loss, delay, ...) of the
+    'access' links (hosts to routers) and of the 'bottleneck' link (r1 to
+    r2), as read from the scenario specification.
+
+    Each path has 2 routers and 2 hosts (h1 -> r1 -> r2 -> h2) with its own
+    links, so flows on different paths do not share a bottleneck. Path `i`
+    uses the 10.i.0.0/16 and 2001:db8:i::/48 prefixes; its r1-r2 link
+    uses 192.168.(i+1).0/30 and 2001:db8:ff:i::/64. Node and interface
+    names are prefixed with `prefix` so that several scenarios can run on
+    the same machine without name collisions.
+
+    With several senders, the extra pairs (h1s2 -> r1, r2 -> h2s2, ...)
+    hang off the same routers and share the r1-r2 link: sender `s` uses
+    the 10.i.(2s+1).0/24 and 10.i.(2s+2).0/24 subnets.
+
+    Returns the network and the list of (h1, h2) pairs, one per path and
+    sender; every h1 knows its (r1, r2) routers.
+    """
+    net = Mininet(link=TCLink)
+
+    print("Creating network topology...")
+
+    paths = []
+    routers = []
+    for index in range(pairs):
+        suffix = path_suffix(index)
+
+        # Add routers
+        r1 = net.addHost(f"{prefix}r1{suffix}", ip=f"10.{index}.1.1/24")
+        r2 = net.addHost(f"{prefix}r2{suffix}", ip=f"10.{index}.2.1/24")
+
+        # Add hosts with IPv4 configuration
+        hosts = []
+        for sender in range(senders):
+            name = f"{suffix}{sender_suffix(sender)}"
+            send, receive = 2 * sender + 1, 2 * sender + 2
+            h1 = net.addHost(f"{prefix}h1{name}", ip=f"10.{index}.{send}.2/24",
+                             defaultRoute=f"via 10.{index}.{send}.1")
+            h2 = net.addHost(f"{prefix}h2{name}", ip=f"10.{index}.{receive}.2/24",
+                             defaultRoute=f"via 10.{index}.{receive}.1")
+            h1.ip6 = f"2001:db8:{index:x}:{send:x}::2"
+            h2.ip6 = f"2001:db8:{index:x}:{receive:x}::2"
+            h1.routers = (r1, r2)
+            hosts.append((h1, h2, send, receive))
+
+        # Link hosts to routers
+        h1, h2, send, receive = hosts[0]
+        net.addLink(h1, r1, **links['access'])
+        net.addLink(h2, r2, **links['access'])
+
+        # Link routers
+        net.addLink(r1, r2, intfName1=f"{r1}-eth1", intfName2=f"{r2}-eth1", **links['bottleneck'])
+
+        # The other senders come after the bottleneck, which keeps its name
+        interfaces = [(f"{r1}-eth0", f"{r2}-eth0")]
+        for h1, h2, send, receive in hosts[1:]:
+            interfaces.append((net.addLink(h1, r1, **links['access']).intf2,
+                               net.addLink(h2, r2, **links['access']).intf2))
+
+        paths.extend((h1, h2) for h1, h2, send, receive in hosts)
+        routers.append((r1, r2, hosts, interfaces))
+
+    for index, (r1, r2, hosts, interfaces) in enumerate(routers):
+        r1.setIP(f"192.168.{index + 1}.1/30", intf=f"{r1}-eth1")
+        r2.setIP(f"192.168.{index + 1}.2/30", intf=f"{r2}-eth1")
+
+        r1.cmd(f"ip -6 addr add 2001:db8:ff:{index:x}::1/64 dev {r1}-eth1")
+        r2.cmd(f"ip -6 addr add 2001:db8:ff:{index:x}::2/64 dev {r2}-eth1")
+
+        for (h1, h2, send, receive), (intf1, intf2) in zip(hosts, interfaces):
+            if send > 1:
+                r1.setIP(f"10.{index}.{send}.1/24", intf=intf1)
+                r2.setIP(f"10.{index}.{receive}.1/24", intf=intf2)
+
+            h1.cmd(f"ip -6 addr add {h1.ip6}/64 dev {h1}-eth0")
+            h2.cmd(f"ip -6 addr add {h2.ip6}/64 dev {h2}-eth0")
+            h1.cmd(f"ip -6 route add default via 2001:db8:{index:x}:{send:x}::1")
+            h2.cmd(f"ip -6 route add default via 2001:db8:{index:x}:{receive:x}::1")
+
+            r1.cmd(f"ip -6 addr add 2001:db8:{index:x}:{send:x}::1/64 dev {intf1}")
+            r2.cmd(f"ip -6 addr add 2001:db8:{index:x}:{receive:x}::1/64 dev {intf2}")
+
+    net.start()
+
+    for index, (r1, r2, hosts, interfaces) in enumerate(routers):
+        enable_ip_forwarding(r1)
+        enable_ip_forwarding(r2)
+
+        for h1, h2, send, receive in hosts:
+            r1.cmd(f"ip route add 10.{index}.{receive}.0/24 via 192.168.{index + 1}.2")
+            r2.cmd(f"ip route add 10.{index}.{send}.0/24 via 192.168.{index + 1}.1")
+
+            # Configuração de rotas IPv6 nos roteadores
+            r1.cmd(f"ip -6 route add 2001:db8:{index:x}:{receive:x}::/64 via 2001:db8:ff:{index:x}::2")
+            r2.cmd(f"ip -6 route add 2001:db8:{index:x}:{send:x}::/64 via 2001:db8:ff:{index:x}::1")
+
+    return net, paths
+
+def cleanup(net):
+    """Stop the Mininet network and clean up processes."""
+    print("Stopping network...")
+    # Only touch the iperf3 processes of this topology: other scenarios may
+    # be running their own tests on the same machine
+    for host in net.hosts:
+        stop_iperf_servers(host)
+        stop_iperf_processes(host)
+    net.stop()
+
+def stop_iperf_processes(host):
+    """Kill the iperf3 processes running inside the host's network namespace."""
+    host.cmd(f"pkill --ns {host.pid} --nslist net -x iperf3")
+
+def wait_queues_drained(router, intf, timeout=5):
+    """Wait until the qdiscs of a router interface hold no queued packets."""
+    deadline = time() + timeout
+    while time() < deadline:
+        stats = router.cmd(f"tc -s qdisc show dev {intf}")
+        backlogs = [line for line in stats.splitlines() if "backlog" in line]
+        if all("backlog 0b 0p" in line for line in backlogs):
+            return True
+        sleep(0.1)
+    return False
+
+def configure_bottleneck(paths, params):
+    """Reconfigure the r1-r2 links of the paths in place with the TCLink parameters `params`.
+
+    TCLink rebuilds the HTB and netem qdiscs of both ends of the link, so
+    the topology moves to another operating point without being rebuilt.
+    """
+    print(f"Reconfiguring bottleneck: {', '.join(f'{name}={value}' for name, value in sorted(params.items()))}")
+    for r1, r2 in dict.fromkeys(h1.routers for h1, h2 in paths):
+        r1.intf(f"{r1}-eth1").config(**params)
+        r2.intf(f"{r2}-eth1").config(**params)
+
+def path_rtt(links):
+    """Propagation RTT of a path in ms: TCLink delays both ends of each of its 3 links."""
+    return 2 * sum(delay_ms(links[name].get('delay')) or 0 for name in ('access', 'bottleneck', 'access'))
+
+def bdp_packets(links, multiple=1):
+    """`multiple` times the bandwidth-delay product of the bottleneck, in full-size packets (at least 2)."""
+    bdp = links['bottleneck']['bw'] * 1e6 / 8 * path_rtt(links) / 1000
+    return max(2, math.ceil(multiple * bdp / MTU))
+
+def qdisc_options(qdisc, limit, bw):
+    """tc options of a queue discipline holding up to `limit` packets on a `bw` Mbit/s link."""
+    if qdisc == 'pfifo':
+        return f"pfifo limit {limit}"
+    if qdisc == 'fq':
+        return f"fq limit {limit} flow_limit {limit}"
+    if qdisc == 'fq_codel':
+        return f"fq_codel limit {limit} memory_limit {max(32 << 20, limit * 2 * MTU)}"
+    if qdisc == 'pie':
+        return f"pie limit {limit}"
+    if qdisc == 'red':
+        # Thresholds at 1/6 and 1/2 of the buffer, the drop probability adapted by the kernel
+        size = limit * MTU
+        low, high = size // 6, size // 2
+        return (f"red limit {size} min {low} max {high} avpkt {MTU} burst {(2 * low + high) // (3 * MTU) + 1} "
+                f"bandwidth {bw}Mbit adaptive")
+    raise ValueError(f"unknown queue discipline {qdisc!r}")
+
+def configure_queue(paths, links, qdisc, buffer_bdp):
+    """Attach the queue discipline `qdisc` with a buffer of `buffer_bdp` BDPs to r1's end of the bottlenecks.
+
+    The queue (handle 20:) replaces the default leaf of the qdiscs TCLink
+    built: it is the child of netem, or of the HTB class without netem, so
+    it is where the standing queue of the rate limit builds up. `qdisc`
+    None restores TCLink's queueing.
+    """
+    bottleneck = links['bottleneck']
+    if has_netem(bottleneck):
+        parent = "parent 10:1"
+    else:
+        parent = "parent 5:1" if has_htb(bottleneck) else "root"
+    for r1, r2 in dict.fromkeys(h1.routers for h1, h2 in paths):
+        if qdisc is None:
+            r1.cmd(f"tc qdisc del dev {r1}-eth1 {parent} handle 20:")
+            continue
+        limit = bdp_packets(links, buffer_bdp)
+        print(f"Configuring {qdisc} queue of {limit} packets ({buffer_bdp:g} BDP) on {r1}-eth1")
+        error = r1.cmd(f"tc qdisc replace dev {r1}-eth1 {parent} handle 20: "
+                       f"{qdisc_options(qdisc, limit, bottleneck['bw'])}").strip()
+        if error:
+            raise RuntimeError(f"Could not configure {qdisc} on {r1}-eth1: {error}")
+
+def reset_between_runs(paths, bottleneck):
+    """Reset the state a reused topology carries over from the previous run.
+
+    The qdiscs of the r1-r2 links are rebuilt with the TCLink parameters
+    `bottleneck` of the next run, which zeroes their counters (and drops
+    any queue discipline configure_queue() attached).
+    """
+    for h1, h2 in paths:
+        # Stop any leftover client of the previous run; the iperf3 servers on
+        # h2 are persistent and health-checked before each test
+        stop_iperf_processes(h1)
+
+        # Forget the cwnd/ssthresh/RTT cached per destination by the kernel
+        for host in (h1, h2):
+            host.cmd("ip tcp_metrics flush all")
+            host.cmd("ip -6 tcp_metrics flush all")
+
+    # Let the bottleneck queues empty before the next measurement
+    for r1, r2 in dict.fromkeys(h1.routers for h1, h2 in paths):
+        wait_queues_drained(r1, f"{r1}-eth1")
+        wait_queues_drained(r2, f"{r2}-eth1")
+        # TCLink only rebuilds links with parameters: the others go back to the default qdisc
+        r1.cmd(f"tc qdisc del dev {r1}-eth1 root")
+        r2.cmd(f"tc qdisc del dev {r2}-eth1 root")
+    configure_bottleneck(paths, bottleneck)
+
+def base_rtt(h1, h2, ip_version, count=5):
+    """Minimum RTT from h1 to h2 in ms, measured with ping on the idle path (None if it failed)."""
+    family, address = ("-6", h2.ip6) if ip_version == "IPv6" else ("-4", h2.IP())
+    output = h1.cmd(f"ping {family} -c {count} -i 0.2 -W 1 {address}")
+    match = re.search(r'= ([\d.]+)/', output)
+    return float(match.group(1)) if match else None
+
+def check_network_health(paths):
+    """Check IPv4 and IPv6 reachability between h1 and h2 on every path."""
+    healthy = True
+    for h1, h2 in paths:
+        ipv4_ok = "1 received" in h1.cmd(f"ping -c 1 -W 1 {h2.IP()}")
+        ipv6_ok = "1 received" in h1.cmd(f"ping -6 -c 1 -W 1 {h2.ip6}")
+        if not (ipv4_ok and ipv6_ok):
+            print(f"Network health check failed for {h1} -> {h2} (IPv4: {ipv4_ok}, IPv6: {ipv6_ok})")
+            healthy = False
+    return healthy
@@ -0,0 +1,176 @@
+"""Per-ACK congestion window capture with the tcp:tcp_probe tracepoint."""
+import os
+import re
+import select
+import subprocess
+import threading
+from time import monotonic
+
+from .timeseries import ProbeSeries
+
+TRACEFS_PATHS = ["/sys/kernel/tracing", "/sys/kernel/debug/tracing"]
+
+EVENT = re.compile(r'\s(\d+\.\d+): tcp_probe: (.*)')
+
+COOKIE = re.compile(r'\bsk:([0-9a-f]+)')
+
+def tracefs_root():
+    """Mount point of tracefs, or None when it is not available."""
+    for path in TRACEFS_PATHS:
+        if os.path.isdir(os.path.join(path, "instances")) and \
+                os.path.isdir(os.path.join(path, "events", "tcp", "tcp_probe")):
+            return path
+    return None
+
+def parse_tcp_probe(line):
+    """Timestamp and fields of a tcp_probe line of trace_pipe, or None for other lines."""
+    match = EVENT.search(line)
+    if not match:
+        return None
+    fields = dict(item.split("=", 1) for item in match.group(2).split() if "=" in item)
+    return float(match.group(1)), fields
+
+def split_address(address):
+    """Host and port of '10.0.0.1:45678' or '[2001:db8::1]:45678'."""
+    host, port = address.rsplit(":", 1)
+    return host.strip("[]"), int(port)
+
+class TcpProbeCapture:
+    """Captures the tcp:tcp_probe events of the flows from `address` on host h1 to `port` during a test.
+
+    The events are recorded in a dedicated tracefs instance, so other
+    tracing users are not disturbed, with a kernel-side filter on the
+    destination port so that only the test flows reach the per-CPU ring
+    buffers. A reader thread streams them from the instance's trace_pipe
+    into a ProbeSeries (one row per ACK the sender processed). Tracepoints
+    are not namespaced: flows of other paths, or of scenarios running in
+    parallel with the same addresses, are seen too. Only the sockets of
+    h1's namespace are kept, by socket cookie: the first event of each
+    cookie looks it up with `ss -e` in the namespace. Events dropped
+    because the reader fell behind are counted from the buffers' overrun
+    statistics.
+
+    start() raises OSError when tracefs or the tracepoint (with its
+    sock_cookie field) is unavailable.
+    """
+
+    def __init__(self, h1, address, port, buffer_kb=8192):
+        self.h1 = h1
+        self.address = address
+        self.port = port
+        self.buffer_kb = buffer_kb
+        self.series = ProbeSeries()
+        self.instance = None
+        self.pipe = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._read, name="tcp-probe", daemon=True)
+        self.start_time = None
+        self.lost = 0
+        self.cookies = {}
+
+    def _write(self, name, value):
+        with open(os.path.join(self.instance, name), "w") as f:
+            f.write(str(value))
+
+    def start(self):
+        root = tracefs_root()
+        if root is None:
+            raise OSError("tracefs with the tcp:tcp_probe event is not available")
+        with open(os.path.join(root, "events", "tcp", "tcp_probe", "format")) as f:
+            if "sock_cookie" not in f.read():
+                raise OSError("the tcp:tcp_probe event has no sock_cookie field to tell the namespaces apart")
+        self.instance = os.path.join(root, "instances", f"testbed-{os.getpid()}-{self.address}-{self.port}")
+        os.mkdir(self.instance)
+        try:
+            # Same clock as time.monotonic(), to align the events with the other series
+            self._write("trace_clock", "mono")
+            self._write("buffer_size_kb", self.buffer_kb)
+            try:
+                self._write("events/tcp/tcp_probe/filter", f"dport == {self.port}")
+            except OSError:
+                pass  # Kernels without the dport field: the reader filters the events
+            self._write("events/tcp/tcp_probe/enable", 1)
+            self.pipe = os.open(os.path.join(self.instance, "trace_pipe"), os.O_RDONLY | os.O_NONBLOCK)
+        except OSError:
+            self.close()
+            raise
+        self.start_time = monotonic()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the capture, after reading the events still in the buffers."""
+        self._write("events/tcp/tcp_probe/enable", 0)
+        self.stopped.set()
+        self.thread.join()
+        self.lost = self._overruns()
+        self.close()
+
+    def close(self):
+        if self.pipe is not None:
+            os.close(self.pipe)
+            self.pipe = None
+        if self.instance is not None:
+            try:
+                os.rmdir(self.instance)
+            except OSError:
+                pass
+            self.instance = None
+
+    def _overruns(self):
+        """Events overwritten in the ring buffers before they were read, or None if unknown."""
+        lost = 0
+        per_cpu = os.path.join(self.instance, "per_cpu")
+        try:
+            for cpu in os.listdir(per_cpu):
+                with open(os.path.join(per_cpu, cpu, "stats")) as f:
+                    lost += sum(int(line.split(":")[1]) for line in f if line.startswith("overrun:"))
+        except (OSError, ValueError):
+            return None
+        return lost
+
+    def _read(self):
+        pending = b""
+        while True:
+            ready, _, _ = select.select([self.pipe], [], [], 0.1)
+            try:
+                data = os.read(self.pipe, 1 << 16) if ready else b""
+            except BlockingIOError:
+                data = b""
+            if not data:
+                if self.stopped.is_set():
+                    break
+                continue
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                self._add(line.decode(errors="replace"))
+
+    def _add(self, line):
+        event = parse_tcp_probe(line)
+        if event is None:
+            return
+        timestamp, fields = event
+        try:
+            host, sport = split_address(fields['src'])
+            if host != self.address or split_address(fields['dest'])[1] != self.port or \
+                    not self._owns(int(fields['sock_cookie'], 16)):
+                return
+            in_flight = (int(fields['snd_nxt'], 16) - int(fields['snd_una'], 16)) % (1 << 32)
+            self.series.add(timestamp - self.start_time, sport, int(fields['snd_cwnd']), int(fields['ssthresh']),
+                            int(fields['srtt']), int(fields['snd_wnd']), in_flight)
+        except (KeyError, ValueError):
+            return
+
+    def _owns(self, cookie):
+        """Whether the socket with this cookie belongs to h1's namespace."""
+        if cookie not in self.cookies:
+            # The socket is still open: its first events arrive while it sends
+            output = self.h1.popen(["ss", "-Htne", f"dport = :{self.port}"], stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL).communicate()[0].decode()
+            self.cookies.update((int(match, 16), True) for match in COOKIE.findall(output))
+            self.cookies.setdefault(cookie, False)
+        return self.cookies[cookie]
+
+    def summary(self):
+        return {'tcp_probe Events': len(self.series), 'tcp_probe Lost Events': '' if self.lost is None else self.lost}